@@ -1,16 +1,109 @@
 import argparse
 import os
+from functools import lru_cache
+
 import torch
 
-from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+from transformers import (AutoConfig, AutoModelForSeq2SeqLM, AutoTokenizer, BitsAndBytesConfig,
+                          MODEL_FOR_SEQ_TO_SEQ_CAUSAL_LM_MAPPING)
 from peft import PeftModel
 
+# CTranslate2 is optional - only needed for the converted int8 runtime
+try:
+    import ctranslate2
+except ImportError:
+    ctranslate2 = None
+
 # Default paths
 MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models/facebook")
 OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "nllb-kumaoni")
+# Created once from the merged model with:
+#   ct2-transformers-converter --model <merged-model-dir> --quantization int8_float16 --output_dir nllb-kumaoni-ct2
+CT2_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "nllb-kumaoni-ct2")
+
+# NLLB language codes used for conditioning. Kumaoni has no NLLB code of its
+# own, so the closest Pahari language (Nepali) is used as the target tag;
+# training/train.py and nllb.py fine-tune with the same pair.
+SRC_LANG = "hin_Deva"
+TGT_LANG = "npi_Deva"
+
+# Half precision on GPU (bf16 where supported), full precision on CPU
+if torch.cuda.is_available():
+    TORCH_DTYPE = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+else:
+    TORCH_DTYPE = torch.float32
+
+# Inputs are truncated to MAX_INPUT_LENGTH tokens; for a compiled model they are
+# padded up to one of PAD_BUCKETS, and each batch up to one of BATCH_BUCKETS
+# rows, so it only ever sees (and warms up) a small, fixed set of shapes
+MAX_INPUT_LENGTH = 64
+PAD_BUCKETS = (16, 32, 64)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32)
+
+# Decoding settings shared by every model.generate call (greedy - one decoder pass per token)
+GENERATION_CONFIG = {
+    "num_beams": 1,
+    "do_sample": False,
+    "no_repeat_ngram_size": 3,
+    "use_cache": True,
+}
+
+def quantization_config(quantize="none"):
+    """Build a bitsandbytes config for the requested quantization, or None"""
+    if quantize == "none":
+        return None
+
+    # NLLB-600M is small enough that bnb dequantization overhead outweighs the
+    # memory savings - NF4/int8 inference is noticeably slower than FP16 here
+    print(f"Warning: {quantize} quantization is slower than FP16 inference for this model size")
+
+    if quantize == "int8":
+        return BitsAndBytesConfig(load_in_8bit=True)
+
+    return BitsAndBytesConfig(
+        load_in_4bit=True,
+        bnb_4bit_quant_type="nf4",
+        bnb_4bit_compute_dtype=TORCH_DTYPE,
+    )
+
+@lru_cache(maxsize=4)
+def supports_static_cache(model_path):
+    """Check whether the model class at model_path can decode into a static KV cache
+
+    Read from the config alone, so it can be answered without loading the weights.
+    """
+    try:
+        config = AutoConfig.from_pretrained(model_path, local_files_only=True)
+        model_class = MODEL_FOR_SEQ_TO_SEQ_CAUSAL_LM_MAPPING[type(config)]
+    except Exception:
+        return False
+    return bool(getattr(model_class, "_supports_static_cache", False))
+
+def should_compile(compile_model=True, base_model_path=MODEL_DIR):
+    """Whether load_model will compile the model for these options
+
+    Only on GPU, and only for models with a static KV cache: with the default
+    cache every decoder step has a new shape, so a shape-specialised graph
+    would be recompiled each step until dynamo gives up and falls back to eager.
+    """
+    return compile_model and torch.cuda.is_available() and supports_static_cache(base_model_path)
 
-def load_model(model_path=OUTPUT_DIR, base_model_path=MODEL_DIR):
-    """Load the fine-tuned model and tokenizer"""
+def load_model(model_path=OUTPUT_DIR, base_model_path=MODEL_DIR, compile_model=True, quantize="none",
+               ct2_dir=CT2_DIR):
+    """Load the fine-tuned model and tokenizer
+
+    If a converted CTranslate2 model exists at ct2_dir (and ctranslate2 is
+    installed), a ctranslate2.Translator is returned in place of the HF model.
+    Results are cached, so repeated calls with the same options - however the
+    arguments are spelled - reuse the already loaded weights.
+    """
+    # Resolve the options to one canonical positional key for the cached loader
+    return _load_model(os.path.abspath(model_path), os.path.abspath(base_model_path), bool(compile_model),
+                       quantize, os.path.abspath(ct2_dir) if ct2_dir else None)
+
+@lru_cache(maxsize=2)
+def _load_model(model_path, base_model_path, compile_model, quantize, ct2_dir):
+    """Cached body of load_model, keyed on its canonicalized options"""
     print(f"Loading model from {model_path}...")
 
     # Check if fine-tuned model exists
@@ -20,13 +113,31 @@ def load_model(model_path=OUTPUT_DIR, base_model_path=MODEL_DIR):
 
     # Load tokenizer
     tokenizer = AutoTokenizer.from_pretrained(model_path, local_files_only=True)
+    tokenizer.src_lang = SRC_LANG
+
+    # Prefer the int8 CTranslate2 runtime when it has been converted
+    if ct2_dir and os.path.isdir(ct2_dir):
+        if ctranslate2 is None:
+            print(f"Found CTranslate2 model at {ct2_dir} but ctranslate2 is not installed")
+        else:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            compute_type = "int8_float16" if device == "cuda" else "int8"
+            translator = ctranslate2.Translator(ct2_dir, device=device, compute_type=compute_type)
+            print(f"Loaded CTranslate2 model from {ct2_dir} ({compute_type})")
+            return translator, tokenizer
+
+    # Load model (unquantized unless explicitly requested)
+    bnb_config = quantization_config(quantize)
 
-    # Load model
     if model_path == base_model_path:
         # Load base model directly
         model = AutoModelForSeq2SeqLM.from_pretrained(
             model_path,
             device_map="auto",
+            torch_dtype=TORCH_DTYPE,
+            quantization_config=bnb_config,
+            attn_implementation="sdpa",  # fused PyTorch attention kernels
+            low_cpu_mem_usage=True,
             local_files_only=True
         )
     else:
@@ -34,6 +145,10 @@ def load_model(model_path=OUTPUT_DIR, base_model_path=MODEL_DIR):
         base_model = AutoModelForSeq2SeqLM.from_pretrained(
             base_model_path,
             device_map="auto",
+            torch_dtype=TORCH_DTYPE,
+            quantization_config=bnb_config,
+            attn_implementation="sdpa",  # fused PyTorch attention kernels
+            low_cpu_mem_usage=True,
             local_files_only=True
         )
 
@@ -45,41 +160,207 @@ def load_model(model_path=OUTPUT_DIR, base_model_path=MODEL_DIR):
             print(f"Error loading fine-tuned model: {e}")
             print("Falling back to base model")
             model = base_model
+        else:
+            # Fold the adapters into the base weights so each layer is a single matmul
+            try:
+                model = model.merge_and_unload()
+                print("Merged LoRA adapters into base weights")
+            except Exception as e:
+                print(f"Could not merge LoRA adapters, using unmerged model: {e}")
+
+    model.eval()
+
+    # Compile the forward pass on GPU (fuses ops and captures CUDA graphs). generate()
+    # calls model.forward for every decoder step, so that is what gets compiled;
+    # wrapping the whole module would leave generate() running the eager forward.
+    if should_compile(compile_model, base_model_path):
+        print("Compiling model with torch.compile...")
+        model.forward = torch.compile(model.forward, mode="reduce-overhead", fullgraph=False, dynamic=False)
+
+        # Pay the compilation cost once, here, instead of on the first request
+        warmup(model, tokenizer)
+    elif compile_model and torch.cuda.is_available():
+        print("Model has no static KV cache support, skipping torch.compile")
 
     return model, tokenizer
 
+def get_translator(model_path=OUTPUT_DIR, base_model_path=MODEL_DIR, ct2_dir=CT2_DIR):
+    """Get the shared (model, tokenizer) pair for serving translations
+
+    Every caller with the same paths gets the same loaded model, whether it
+    calls this or load_model.
+    """
+    return load_model(model_path, base_model_path, ct2_dir=ct2_dir)
+
+def warmup(model, tokenizer, steps=3):
+    """Run a few dummy generations per (batch, input length) bucket so compilation
+    and CUDA graph capture happen before real inputs"""
+    for batch in BATCH_BUCKETS:
+        for bucket in PAD_BUCKETS:
+            tokens = tokenizer(["hello"] * batch, max_length=MAX_INPUT_LENGTH, truncation=True)
+            inputs = _bucket_pad(tokens, tokenizer, buckets=(bucket,))
+            inputs = {k: v.to(model.device) for k, v in inputs.items()}
+
+            for _ in range(steps):
+                with torch.inference_mode():
+                    model.generate(**inputs, **generation_kwargs(model, tokenizer))
+
 def translate(text, model, tokenizer, max_length=100):
     """Translate Hinglish text to Kumaoni"""
-    # Format the input prompt to match training format
-    prompt = f"Translate from Hinglish to Kumaoni language: {text}"
+    if is_ct2(model):
+        return _translate_ct2([text], model, tokenizer, max_length)[0]
 
-    # Tokenize the input
-    inputs = tokenizer(prompt, return_tensors="pt", max_length=64, truncation=True, padding="max_length")
+    # Tokenize the input (the tokenizer adds the source language token)
+    # (no padding needed for a single input unless the model is compiled)
+    if is_compiled(model):
+        inputs = _bucket_pad(tokenizer([text], max_length=MAX_INPUT_LENGTH, truncation=True), tokenizer)
+    else:
+        # An unpadded input's attention mask is all ones, so leave it out
+        inputs = tokenizer(text, return_tensors="pt", max_length=MAX_INPUT_LENGTH, truncation=True,
+                           return_attention_mask=False)
     inputs = {k: v.to(model.device) for k, v in inputs.items()}
 
-    # Generate the translation
-    with torch.no_grad():
-        outputs = model.generate(
-            **inputs,
-            max_new_tokens=max_length,
-            num_beams=5,
-            temperature=0.7,
-            top_p=0.9,
-            do_sample=True,
-            pad_token_id=tokenizer.pad_token_id,
-            eos_token_id=tokenizer.eos_token_id
-        )
+    # Generate the translation (greedy decoding - one decoder pass per token)
+    with torch.inference_mode():
+        outputs = model.generate(**inputs, **generation_kwargs(model, tokenizer, max_length, _input_length(inputs)))
 
     # Decode the generated text
-    generated_text = tokenizer.decode(outputs[0], skip_special_tokens=True)
+    return tokenizer.decode(outputs[0], skip_special_tokens=True).strip()
 
-    # Extract only the Kumaoni part
-    if "Kumaoni:" in generated_text:
-        translation = generated_text.split("Kumaoni:")[-1].strip()
+def translate_batch(texts, model, tokenizer, max_length=100, batch_size=32):
+    """Translate a list of Hinglish texts to Kumaoni, batch_size texts at a time"""
+    translations = []
+
+    for start in range(0, len(texts), batch_size):
+        chunk = texts[start:start + batch_size]
+
+        if is_ct2(model):
+            translations.extend(_translate_ct2(chunk, model, tokenizer, max_length))
+        else:
+            translations.extend(generate_batch(chunk, model, tokenizer, max_length))
+
+    return translations
+
+def generate_batch(texts, model, tokenizer, max_length=100, **overrides):
+    """Translate one batch of texts with a single model.generate call
+
+    overrides replace individual generation_kwargs entries (e.g. num_beams).
+    """
+    # Tokenize the whole batch at once, padding to the longest input
+    # (or to the nearest batch and length buckets for a compiled model)
+    if is_compiled(model):
+        inputs = _bucket_pad(tokenizer(texts, max_length=MAX_INPUT_LENGTH, truncation=True), tokenizer)
     else:
-        translation = generated_text.strip()
+        inputs = tokenizer(texts, return_tensors="pt", max_length=MAX_INPUT_LENGTH, truncation=True, padding=True)
+    inputs = {k: v.to(model.device) for k, v in inputs.items()}
+
+    kwargs = {**generation_kwargs(model, tokenizer, max_length, _input_length(inputs)), **overrides}
+    with torch.inference_mode():
+        outputs = model.generate(**inputs, **kwargs)
+
+    # Rows added to fill a batch bucket are dropped
+    generated_texts = tokenizer.batch_decode(outputs[:len(texts)], skip_special_tokens=True)
+    return [text.strip() for text in generated_texts]
+
+def generation_kwargs(model, tokenizer, max_length=100, input_length=None):
+    """Keyword arguments shared by every model.generate call"""
+    # A compiled model keeps the fixed cap since a different cache length per
+    # call would force a recompile
+    max_new_tokens = max_length
+    if input_length is not None and not is_compiled(model):
+        max_new_tokens = capped_length(max_length, input_length)
+
+    kwargs = {
+        **GENERATION_CONFIG,
+        "max_new_tokens": max_new_tokens,
+        "forced_bos_token_id": tokenizer.convert_tokens_to_ids(TGT_LANG),
+        "pad_token_id": tokenizer.pad_token_id,
+        "eos_token_id": tokenizer.eos_token_id,
+    }
+
+    # A preallocated KV cache avoids growing the cache every decoder step, which is
+    # what lets the compiled model replay CUDA graphs (should_compile only compiles
+    # models that support one)
+    if is_compiled(model):
+        kwargs["cache_implementation"] = "static"
+
+    return kwargs
+
+def capped_length(max_length, input_length):
+    """Short inputs rarely need max_length target tokens, so cap generation at about twice the input length"""
+    return min(max_length, max(16, 2 * input_length))
 
-    return translation
+def decoding_params(max_length=100, compile_model=True, quantize="none", ct2_dir=CT2_DIR, base_model_path=MODEL_DIR):
+    """Settings that determine translate_batch's output for the given load_model options
+
+    Computed without loading the model, so callers can key cached translations on it.
+    """
+    if ct2_dir and os.path.isdir(ct2_dir) and ctranslate2 is not None:
+        return {"runtime": "ctranslate2", "beam_size": 1, "max_decoding_length": max_length, "length_cap": True,
+                "no_repeat_ngram_size": GENERATION_CONFIG["no_repeat_ngram_size"],
+                "max_input_length": MAX_INPUT_LENGTH, "tgt_lang": TGT_LANG}
+
+    compiled = should_compile(compile_model, base_model_path)
+    return {
+        "runtime": "transformers",
+        **GENERATION_CONFIG,
+        "max_length": max_length,
+        # A compiled model decodes into a static cache, without the 2x input length cap
+        "length_cap": not compiled,
+        "static_cache": compiled,
+        "quantize": quantize,
+        "torch_dtype": str(TORCH_DTYPE),
+        "max_input_length": MAX_INPUT_LENGTH,
+        "src_lang": SRC_LANG,
+        "tgt_lang": TGT_LANG,
+    }
+
+def _input_length(inputs):
+    """Length of the longest unpadded sequence in the tokenized inputs"""
+    if "attention_mask" in inputs:
+        return int(inputs["attention_mask"].sum(dim=1).max().item())
+    return inputs["input_ids"].shape[1]
+
+def _translate_ct2(texts, translator, tokenizer, max_length=100):
+    """Translate texts with a CTranslate2 translator"""
+    source = [
+        tokenizer.convert_ids_to_tokens(tokenizer.encode(text, max_length=MAX_INPUT_LENGTH, truncation=True))
+        for text in texts
+    ]
+    # Decode like generation_kwargs does for the HF model
+    results = translator.translate_batch(
+        source,
+        target_prefix=[[TGT_LANG]] * len(source),
+        beam_size=1,
+        no_repeat_ngram_size=GENERATION_CONFIG["no_repeat_ngram_size"],
+        max_decoding_length=capped_length(max_length, max(len(tokens) for tokens in source))
+    )
+
+    translations = []
+    for result in results:
+        token_ids = tokenizer.convert_tokens_to_ids(result.hypotheses[0])
+        translations.append(tokenizer.decode(token_ids, skip_special_tokens=True).strip())
+    return translations
+
+def is_ct2(model):
+    """Check whether the model is a CTranslate2 translator"""
+    return ctranslate2 is not None and isinstance(model, ctranslate2.Translator)
+
+def is_compiled(model):
+    """Check whether the model's forward pass has been wrapped with torch.compile"""
+    return hasattr(getattr(model, "forward", None), "_torchdynamo_orig_callable")
+
+def _bucket_pad(tokens, tokenizer, buckets=PAD_BUCKETS, batch_buckets=BATCH_BUCKETS):
+    """Pad tokenized inputs to the smallest bucket that fits the longest sequence,
+    repeating the last row until the batch fills the smallest batch bucket that fits it"""
+    rows = len(tokens["input_ids"])
+    batch = next((bucket for bucket in batch_buckets if bucket >= rows), rows)
+    if batch > rows:
+        tokens = {k: list(v) + [v[-1]] * (batch - rows) for k, v in tokens.items()}
+
+    longest = max(len(ids) for ids in tokens["input_ids"])
+    target = next((bucket for bucket in buckets if bucket >= longest), longest)
+    return tokenizer.pad(tokens, padding="max_length", max_length=target, return_tensors="pt")
 
 def main():
     parser = argparse.ArgumentParser(description="Translate Hinglish to Kumaoni")
@@ -87,11 +368,22 @@ def main():
     parser.add_argument("--model_path", type=str, default=OUTPUT_DIR, help="Path to the fine-tuned model")
     parser.add_argument("--base_model", type=str, default=MODEL_DIR, help="Path to the base model")
     parser.add_argument("--interactive", action="store_true", help="Run in interactive mode")
+    parser.add_argument("--input_file", type=str, help="File with one Hinglish text per line to translate in batches")
+    parser.add_argument("--output_file", type=str, help="Where to write batch translations (default: stdout)")
+    parser.add_argument("--batch_size", type=int, default=32, help="Batch size for --input_file")
+    parser.add_argument("--no_compile", action="store_true", help="Disable torch.compile on GPU")
+    parser.add_argument("--ct2_dir", type=str, default=CT2_DIR, help="Path to a converted CTranslate2 model")
+    parser.add_argument("--quantize", choices=["none", "int8", "nf4"], default="none",
+                        help="Load the model quantized with bitsandbytes (default: none, slower for this model)")
 
     args = parser.parse_args()
 
     # Load the model and tokenizer
-    model, tokenizer = load_model(args.model_path, args.base_model)
+    model, tokenizer = load_model(args.model_path, args.base_model, compile_model=not args.no_compile,
+                                  quantize=args.quantize, ct2_dir=args.ct2_dir)
+
+    # Nothing in this script needs autograd
+    torch.set_grad_enabled(False)
 
     if args.interactive:
         print("=== Hinglish to Kumaoni Translation ===")
@@ -105,6 +397,22 @@ def main():
             translation = translate(text, model, tokenizer)
             print(f"Kumaoni: {translation}")
 
+    elif args.input_file:
+        with open(args.input_file, 'r', encoding='utf-8') as f:
+            texts = [line.strip() for line in f if line.strip()]
+
+        translations = translate_batch(texts, model, tokenizer, batch_size=args.batch_size)
+
+        if args.output_file:
+            with open(args.output_file, 'w', encoding='utf-8') as f:
+                for translation in translations:
+                    f.write(translation + "\n")
+            print(f"Wrote {len(translations)} translations to {args.output_file}")
+        else:
+            for text, translation in zip(texts, translations):
+                print(f"Hinglish: {text}")
+                print(f"Kumaoni: {translation}")
+
     elif args.text:
         translation = translate(args.text, model, tokenizer)
         print(f"Hinglish: {args.text}")
@@ -9,18 +9,25 @@ from transformers import (
     BitsAndBytesConfig
 )
 from peft import LoraConfig, get_peft_model, prepare_model_for_kbit_training
+import os
 import torch
 
 # Config
 model_name = "facebook/nllb-200-distilled-600M"
 dataset_path = "data.json"  # Your dataset
 output_dir = "./nllb-kumaoni-translator"
+src_lang = "hin_Deva"  # NLLB language codes (Nepali stands in for Kumaoni)
+tgt_lang = "npi_Deva"
+
+# BF16 needs no loss scaling and is safer for NF4 dequantization; fall back to FP16
+use_bf16 = torch.cuda.is_available() and torch.cuda.is_bf16_supported()
+compute_dtype = torch.bfloat16 if use_bf16 else torch.float16
 
 # 4-bit Quantization
 bnb_config = BitsAndBytesConfig(
     load_in_4bit=True,
     bnb_4bit_quant_type="nf4",
-    bnb_4bit_compute_dtype=torch.float16,
+    bnb_4bit_compute_dtype=compute_dtype,
 )
 
 # Load model
@@ -29,14 +36,16 @@ model = AutoModelForSeq2SeqLM.from_pretrained(
     quantization_config=bnb_config,
     device_map="auto"
 )
-tokenizer = AutoTokenizer.from_pretrained(model_name)
+tokenizer = AutoTokenizer.from_pretrained(model_name, src_lang=src_lang, tgt_lang=tgt_lang)
 
 # LoRA setup
 model = prepare_model_for_kbit_training(model)
+model.gradient_checkpointing_enable(gradient_checkpointing_kwargs={"use_reentrant": False})
+model.config.use_cache = False  # the KV cache is useless with checkpointing
 peft_config = LoraConfig(
     r=8,
     lora_alpha=32,
-    target_modules=["q_proj", "v_proj"],
+    target_modules=["q_proj", "k_proj", "v_proj", "out_proj", "fc1", "fc2"],  # all linear projections
     lora_dropout=0.05,
     task_type="SEQ_2_SEQ_LM"
 )
@@ -44,35 +53,43 @@ model = get_peft_model(model, peft_config)
 
 # Dataset prep
 def format_data(examples):
-    inputs = [f"translate Hinglish to Kumaoni: {x}" for x in examples["hinglish"]]
-    model_inputs = tokenizer(inputs, max_length=128, truncation=True, padding="max_length")
-    with tokenizer.as_target_tokenizer():
-        labels = tokenizer(
-            examples["kumaoni"],
-            max_length=128,
-            truncation=True,
-            padding="max_length"
-        )
-    model_inputs["labels"] = labels["input_ids"]
+    # Language tokens replace the natural-language instruction prefix.
+    # No padding here - the collator pads each batch to its longest example
+    model_inputs = tokenizer(
+        examples["hinglish"],
+        text_target=examples["kumaoni"],
+        max_length=128,
+        truncation=True,
+        padding=False
+    )
     return model_inputs
 
 dataset = load_dataset("json", data_files=dataset_path, split="train")
-dataset = dataset.map(format_data, batched=True)
+dataset = dataset.map(
+    format_data,
+    batched=True,
+    num_proc=os.cpu_count(),
+    remove_columns=dataset.column_names
+)
 
 # Training
 trainer = Seq2SeqTrainer(
     model=model,
     args=Seq2SeqTrainingArguments(
         output_dir=output_dir,
-        per_device_train_batch_size=4,
-        gradient_accumulation_steps=2,
+        per_device_train_batch_size=8,  # checkpointing frees enough memory for 2x the batch
+        gradient_accumulation_steps=1,
         learning_rate=5e-5,
         num_train_epochs=3,
-        fp16=True,
+        bf16=use_bf16,
+        fp16=not use_bf16,
+        gradient_checkpointing=True,
+        gradient_checkpointing_kwargs={"use_reentrant": False},
+        optim="paged_adamw_8bit",  # 8-bit optimizer states (bitsandbytes >= 0.41)
         save_strategy="epoch"
     ),
     train_dataset=dataset,
-    data_collator=DataCollatorForSeq2Seq(tokenizer, model=model),
+    data_collator=DataCollatorForSeq2Seq(tokenizer, model=model, padding="longest", pad_to_multiple_of=8),
 )
 trainer.train()
 trainer.save_model(output_dir)
\ No newline at end of file
@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+from contextlib import asynccontextmanager
+
+import uvicorn
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+from generate import CT2_DIR, MODEL_DIR, OUTPUT_DIR, get_translator, translate_batch
+
+# Requests arriving within BATCH_TIMEOUT seconds of each other share one generate call
+MAX_BATCH_SIZE = 32
+BATCH_TIMEOUT = 0.01
+
+class TranslationRequest(BaseModel):
+    text: str
+
+class BatchScheduler:
+    """Collect concurrent translation requests into batches for translate_batch"""
+
+    def __init__(self, model, tokenizer, max_batch_size=MAX_BATCH_SIZE, timeout=BATCH_TIMEOUT):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout
+        self.queue = asyncio.Queue()
+
+    async def submit(self, text):
+        """Queue a text for translation and wait for its result"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, future))
+        return await future
+
+    async def run(self):
+        """Pop up to max_batch_size requests per timeout window and translate them together"""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.timeout
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                # Generation blocks, so run it off the event loop
+                translations = await loop.run_in_executor(
+                    None, translate_batch, texts, self.model, self.tokenizer, 100, self.max_batch_size
+                )
+            except Exception as e:
+                print(f"Translation error: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), translation in zip(batch, translations):
+                if not future.done():
+                    future.set_result(translation)
+
+def create_app(model, tokenizer, max_batch_size=MAX_BATCH_SIZE, timeout=BATCH_TIMEOUT):
+    """Create the FastAPI app serving the given model"""
+    scheduler = BatchScheduler(model, tokenizer, max_batch_size, timeout)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        task = asyncio.create_task(scheduler.run())
+        yield
+        task.cancel()
+
+    app = FastAPI(title="Hinglish to Kumaoni Translation", lifespan=lifespan)
+
+    @app.post("/translate")
+    async def translate(request: TranslationRequest):
+        translation = await scheduler.submit(request.text)
+        return {"hinglish": request.text, "kumaoni": translation}
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Hinglish to Kumaoni translation over HTTP")
+    parser.add_argument("--model_path", type=str, default=OUTPUT_DIR, help="Path to the fine-tuned model")
+    parser.add_argument("--base_model", type=str, default=MODEL_DIR, help="Path to the base model")
+    parser.add_argument("--ct2_dir", type=str, default=CT2_DIR, help="Path to a converted CTranslate2 model")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Host to bind to")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument("--max_batch_size", type=int, default=MAX_BATCH_SIZE, help="Largest batch per generate call")
+    parser.add_argument("--batch_timeout", type=float, default=BATCH_TIMEOUT,
+                        help="Seconds to wait for more requests before running a batch")
+
+    args = parser.parse_args()
+
+    # Load the model and tokenizer once for the whole server (shared with any other caller in the process)
+    model, tokenizer = get_translator(args.model_path, args.base_model, ct2_dir=args.ct2_dir)
+
+    app = create_app(model, tokenizer, args.max_batch_size, args.batch_timeout)
+    uvicorn.run(app, host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -11,12 +11,23 @@ Features:
 """
 
 import os
-import json
 import re
 import argparse
 import random
+import pickle
+import hashlib
 import datetime
-from collections import defaultdict
+from collections import defaultdict, deque
+from functools import lru_cache
+
+from jsonio import loads_json, dumps_json, load_json, write_json
+from learned_log import LEARNED_WAL_PATH, LearnedLog
+
+# pyahocorasick is optional - phrase substitution falls back to a regex alternation
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 # Paths for data files
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -29,6 +40,41 @@ CONVERSATIONS_PATH = os.path.join(DATA_DIR, "conversations.json")
 IDIOMS_PATH = os.path.join(DATA_DIR, "idioms.json")
 CHAT_RESPONSES_PATH = os.path.join(DATA_DIR, "chat_responses.json")
 CONVERSATION_HISTORY_PATH = os.path.join(DATA_DIR, "conversation_history.json")
+# One JSONL file per session, appended one exchange at a time
+HISTORY_DIR = os.path.join(DATA_DIR, "history")
+HISTORY_FLUSH_EVERY = 10
+# Pickled copy of the loaded data and lookup tables, reused while the sources are unchanged
+STATE_CACHE_PATH = os.path.join(DATA_DIR, ".cache", "state.pkl")
+STATE_CACHE_VERSION = 8
+STATE_SOURCE_PATHS = [VOCAB_MAP_PATH, PHRASES_PATH, GRAMMAR_RULES_PATH, PATTERNS_PATH,
+                      CHAT_RESPONSES_PATH, LEARNED_WAL_PATH]
+STATE_CACHE_ATTRS = ["data", "learned_log", "_rev", "_vocab_values", "_phrase_sub_h2k", "_phrase_sub_k2h",
+                     "_phrase_re_h2k", "_phrase_re_k2h", "_phrase_ac_h2k", "_phrase_ac_k2h", "_min_phrase_len",
+                     "_ending_re"]
+
+# Words inside a sentence; punctuation and spacing around them are left in place
+WORD_RE = re.compile(r"[\w']+")
+
+class _LazyStr:
+    """String computed on first use, e.g. when a response's translation is printed"""
+    
+    def __init__(self, fn):
+        self._fn = fn
+        self._value = None
+    
+    def __str__(self):
+        if self._value is None:
+            self._value = self._fn()
+        return self._value
+    
+    def __format__(self, format_spec):
+        return format(str(self), format_spec)
+    
+    def __eq__(self, other):
+        return str(self) == str(other)
+    
+    def __hash__(self):
+        return hash(str(self))
 
 # ANSI color codes for terminal output
 class Colors:
@@ -43,22 +89,44 @@ class Colors:
     UNDERLINE = '\033[4m'
 
 class KumaoniChatbot:
+    # Intent keywords, matched against the words and word pairs of the input
+    _GREETING_WORDS = frozenset({"namaste", "namaskar", "hello", "hi", "hey", "good morning", "good evening",
+                                 "kaise ho", "kas cha"})
+    _QUESTION_WORDS = frozenset({"kaun", "kya", "ke"})
+    _ADDRESSEE_WORDS = frozenset({"tum", "aap", "tu"})
+    _TOPIC_WORDS = (
+        ("weather", frozenset({"mausam", "barish", "dhoop", "garmi", "sardi", "barf"})),
+        ("food", frozenset({"khana", "khano", "bhojan", "vyanjan", "pakwan", "recipe", "swad"})),
+        ("culture", frozenset({"sanskriti", "tyohar", "parv", "lok", "geet", "nritya", "parampara"}))
+    )
+    
     def __init__(self):
         """Initialize the Kumaoni chatbot"""
+        # Per-instance lookup caches (an lru_cache on the methods would be shared by
+        # every instance and keep each one alive through its self key)
+        self._detect_language_cached = lru_cache(maxsize=2048)(self._detect_language_uncached)
+        self._detect_intent_cached = lru_cache(maxsize=2048)(self._detect_intent_uncached)
+        self._translate_word_cached = lru_cache(maxsize=2048)(self._translate_word_uncached)
+        self._translate_cached = lru_cache(maxsize=2048)(self._translate_uncached)
+        
         # Create data directory if it doesn't exist
         os.makedirs(DATA_DIR, exist_ok=True)
         
-        # Load all data files
-        self.data = {
-            "vocab": self.load_json(VOCAB_MAP_PATH, {}),
-            "phrases": self.load_json(PHRASES_PATH, {}),
-            "grammar": self.load_json(GRAMMAR_RULES_PATH, self.default_grammar_rules()),
-            "patterns": self.load_json(PATTERNS_PATH, self.default_patterns()),
-            "conversations": self.load_json(CONVERSATIONS_PATH, self.default_conversations()),
-            "idioms": self.load_json(IDIOMS_PATH, self.default_idioms()),
-            "chat_responses": self.load_json(CHAT_RESPONSES_PATH, self.default_chat_responses()),
-            "history": self.load_json(CONVERSATION_HISTORY_PATH, {"sessions": []})
-        }
+        # Load all data files and lookup tables, from the state cache if it is up to date
+        # Digest of the last payload written to each JSON file, so unchanged saves are skipped
+        self._last_write_hash = {}
+        if not self.load_state_cache():
+            self.load_data()
+            self.save_state_cache()
+        
+        # Shuffled response pools, rotated so replies don't repeat back to back
+        self.build_response_pools()
+        
+        # Conversation history is appended to a per-session file, opened on first use
+        self._history_file = None
+        
+        # Bumped whenever vocab/phrases change, so cached lookups are invalidated
+        self._data_version = 0
         
         # Initialize conversation session
         self.session_id = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
@@ -73,33 +141,203 @@ class KumaoniChatbot:
         print(f"Loaded vocabulary with {len(self.data['vocab'])} words")
         print(f"Loaded phrases with {len(self.data['phrases'])} phrases")
         print(f"Loaded {len(self.data['chat_responses'])} chat response patterns")
-        print(f"Loaded {len(self.data['idioms'])} Kumaoni idioms")
         print(f"Kumaoni Chatbot initialized successfully!")
     
-    def load_json(self, file_path, default_value):
-        """Load JSON data from file, or return default if file doesn't exist"""
+    def load_data(self):
+        """Load all data files and build the lookup tables derived from them"""
+        self.data = {
+            "vocab": self.load_json(VOCAB_MAP_PATH, {}),
+            "phrases": self.load_json(PHRASES_PATH, {}),
+            "grammar": self.load_json(GRAMMAR_RULES_PATH, self.default_grammar_rules()),
+            "patterns": self.load_json(PATTERNS_PATH, self.default_patterns()),
+            # Only used by get_stats, loaded on first access
+            "conversations": None,
+            "idioms": None,
+            "chat_responses": self.load_json(CHAT_RESPONSES_PATH, self.default_chat_responses())
+        }
+        
+        # Apply words/phrases learned since the last compaction
+        self.learned_log = LearnedLog()
+        self.learned_log.replay(self.data)
+        
+        # Build Kumaoni -> Hinglish lookup tables for reverse translation
+        self.build_reverse_indexes()
+        self.build_phrase_patterns()
+    
+    @property
+    def idioms(self):
+        """Kumaoni idioms, loaded from idioms.json on first access"""
+        if self.data["idioms"] is None:
+            self.data["idioms"] = self.load_json(IDIOMS_PATH, self.default_idioms())
+        return self.data["idioms"]
+    
+    @property
+    def conversations(self):
+        """Conversation templates, loaded from conversations.json on first access"""
+        if self.data["conversations"] is None:
+            self.data["conversations"] = self.load_json(CONVERSATIONS_PATH, self.default_conversations())
+        return self.data["conversations"]
+    
+    def state_cache_key(self):
+        """Modification times of every file the cached state is built from"""
+        key = {"version": STATE_CACHE_VERSION, "ahocorasick": ahocorasick is not None}
+        for path in STATE_SOURCE_PATHS:
+            try:
+                key[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                key[path] = None
+        return key
+    
+    def load_state_cache(self):
+        """Restore the loaded data and lookup tables from the state cache, if it is up to date"""
         try:
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            else:
-                # Create the file with default value
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(default_value, f, ensure_ascii=False, indent=2)
-                return default_value
+            with open(STATE_CACHE_PATH, 'rb') as f:
+                cached = pickle.load(f)
+        except Exception:
+            return False
+        
+        if cached.get("key") != self.state_cache_key():
+            return False
+        
+        self.__dict__.update(cached["state"])
+        return True
+    
+    def save_state_cache(self):
+        """Pickle the loaded data and lookup tables for the next startup"""
+        try:
+            os.makedirs(os.path.dirname(STATE_CACHE_PATH), exist_ok=True)
+            state = {attr: getattr(self, attr) for attr in STATE_CACHE_ATTRS}
+            with open(STATE_CACHE_PATH, 'wb') as f:
+                pickle.dump({"key": self.state_cache_key(), "state": state}, f, protocol=5)
         except Exception as e:
-            print(f"Error loading {file_path}: {e}")
-            return default_value
+            print(f"Error saving {STATE_CACHE_PATH}: {e}")
+    
+    def load_json(self, file_path, default_value):
+        """Load JSON data from file, or create it with the default value if it doesn't exist"""
+        return load_json(file_path, default_value, create=True)
+    
+    def compact_learned_log(self):
+        """Write vocab and phrases back to their JSON files and truncate the learned log"""
+        self.learned_log.compact(self.data, self.save_json)
+    
+    def close(self):
+        """Flush learned data to the JSON files and close the history and learned log files; call before exiting"""
+        self.compact_learned_log()
+        self.learned_log.close()
+        
+        if self._history_file is not None:
+            self._history_file.close()
+            self._history_file = None
+    
+    def reverse_mapping(self, mapping):
+        """Invert a Hinglish -> Kumaoni mapping, keyed by lowercase Kumaoni (first entry wins)"""
+        reverse = {}
+        for hinglish, kumaoni in mapping.items():
+            reverse.setdefault(kumaoni.lower(), hinglish)
+        return reverse
+    
+    def build_reverse_indexes(self):
+        """Build the reverse (Kumaoni -> Hinglish) lookup tables"""
+        self._rev = {
+            "vocab": self.reverse_mapping(self.data["vocab"]),
+            "phrases": self.reverse_mapping(self.data["phrases"]),
+            "pronouns": self.reverse_mapping(self.data["grammar"]["pronouns"]),
+            "question_words": self.reverse_mapping(self.data["grammar"]["question_words"]),
+            "postpositions": self.reverse_mapping(self.data["grammar"]["postpositions"])
+        }
+        
+        # Kumaoni words, for O(1) membership checks in detect_language
+        self._vocab_values = set(self.data["vocab"].values())
+        
+        # Longest verb ending of a word in one match (at least one character must precede it)
+        endings = sorted(self.data["grammar"]["verb_endings"], key=len, reverse=True)
+        self._ending_re = None
+        if endings:
+            self._ending_re = re.compile(r"(?<=.)(" + "|".join(re.escape(e) for e in endings) + r")$", re.DOTALL)
+    
+    def compile_alternation(self, phrases):
+        """Compile a case-insensitive regex matching any of the phrases as whole words, longest first"""
+        if not phrases:
+            return None
+        alternation = "|".join(re.escape(phrase) for phrase in sorted(phrases, key=len, reverse=True))
+        return re.compile(r"(?<!\w)(" + alternation + r")(?!\w)", re.IGNORECASE)
+    
+    def build_phrase_patterns(self):
+        """Build the phrase substitution regexes used by translate, one per direction"""
+        self._phrase_sub_h2k = {hinglish.lower(): kumaoni for hinglish, kumaoni in self.data["phrases"].items()}
+        self._phrase_sub_k2h = self._rev["phrases"]
+        self._phrase_re_h2k = self.compile_alternation(self._phrase_sub_h2k)
+        self._phrase_re_k2h = self.compile_alternation(self._phrase_sub_k2h)
+        self._phrase_ac_h2k = self.build_automaton(self._phrase_sub_h2k)
+        self._phrase_ac_k2h = self.build_automaton(self._phrase_sub_k2h)
+        # Texts shorter than every phrase cannot contain one
+        self._min_phrase_len = min((len(phrase) for phrase in self._phrase_sub_h2k.keys() | self._phrase_sub_k2h.keys()),
+                                   default=0)
+    
+    def build_automaton(self, substitutions):
+        """Build an Aho-Corasick automaton over the lowercase phrases, if pyahocorasick is available"""
+        if ahocorasick is None or not substitutions:
+            return None
+        automaton = ahocorasick.Automaton()
+        for phrase, replacement in substitutions.items():
+            automaton.add_word(phrase, (len(phrase), replacement))
+        automaton.make_automaton()
+        return automaton
+    
+    def substitute_phrases(self, text, automaton):
+        """Replace whole-word phrase matches in one automaton pass, leftmost then longest first"""
+        text_lower = text.lower()
+        # Offsets into the lowercase text must line up with the original
+        if len(text_lower) != len(text):
+            return None
+        
+        matches = []
+        for end, (length, replacement) in automaton.iter(text_lower):
+            start = end - length + 1
+            if start > 0 and (text_lower[start - 1].isalnum() or text_lower[start - 1] == "_"):
+                continue
+            if end + 1 < len(text_lower) and (text_lower[end + 1].isalnum() or text_lower[end + 1] == "_"):
+                continue
+            matches.append((start, -length, replacement))
+        
+        # Splice in non-overlapping matches, as the regex alternation would pick them
+        pieces = []
+        position = 0
+        for start, negative_length, replacement in sorted(matches):
+            if start < position:
+                continue
+            pieces.append(text[position:start])
+            pieces.append(replacement)
+            position = start - negative_length
+        pieces.append(text[position:])
+        return "".join(pieces)
+    
+    def build_response_pools(self):
+        """Shuffle each intent's chat responses into a deque to rotate through"""
+        self._response_pools = {
+            intent: deque(random.sample(responses, len(responses)))
+            for intent, responses in self.data["chat_responses"].items()
+        }
+    
+    def find_intent_keywords(self, text_lower):
+        """Return the set of words and two-word sequences in the text, to intersect with intent keywords"""
+        words = WORD_RE.findall(text_lower)
+        tokens = set(words)
+        # Two-word keywords such as "good morning" and "kaise ho"
+        tokens.update(" ".join(pair) for pair in zip(words, words[1:]))
+        return tokens
     
     def save_json(self, file_path, data):
-        """Save JSON data to file"""
-        try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+        """Save JSON data to file atomically, skipping the write if nothing changed"""
+        payload = dumps_json(data)
+        digest = hashlib.blake2b(payload, digest_size=8).digest()
+        if self._last_write_hash.get(file_path) == digest:
             return True
-        except Exception as e:
-            print(f"Error saving {file_path}: {e}")
+        
+        if not write_json(file_path, payload):
             return False
+        self._last_write_hash[file_path] = digest
+        return True
     
     def default_grammar_rules(self):
         """Default grammar rules for Kumaoni"""
@@ -246,28 +484,45 @@ class KumaoniChatbot:
             ]
         }
     
-    def detect_language(self, text):
+    def detect_language(self, text, text_lower=None):
         """Detect if the input is more Hinglish or Kumaoni"""
+        # Only the lowercase form matters, so callers can pass one they already have
+        return self._detect_language_cached(text_lower or text.lower(), self._data_version)
+    
+    def _detect_language_uncached(self, text_lower, data_version):
+        """Body of detect_language, cached per instance on the lowercased text and data version"""
         hinglish_count = 0
         kumaoni_count = 0
         
-        words = text.lower().split()
-        for word in words:
+        words = text_lower.split()
+        # Phrase matches are worth 3 each, so this is the most the phrase checks can add to either side
+        phrase_weight = 3 * len(self.data["phrases"]) if len(text_lower) >= self._min_phrase_len else 0
+        for i, word in enumerate(words, 1):
             word = word.strip(".,?!\"'")
             
             # Check if word is in vocabulary
             if word in self.data["vocab"]:
                 hinglish_count += 1
-            elif word in [v for v in self.data["vocab"].values()]:
+            elif word in self._vocab_values:
                 kumaoni_count += 1
+            
+            # Stop once the remaining words and phrases can no longer change the verdict
+            remaining = len(words) - i + phrase_weight
+            if hinglish_count - kumaoni_count >= remaining:
+                return "hinglish"
+            if kumaoni_count - hinglish_count > remaining:
+                return "kumaoni"
+        
+        if not phrase_weight:
+            return "kumaoni" if kumaoni_count > hinglish_count else "hinglish"
         
         # Check phrases
         for phrase in self.data["phrases"]:
-            if phrase in text.lower():
+            if phrase in text_lower:
                 hinglish_count += 3  # Give more weight to phrases
         
         for kumaoni_phrase in self.data["phrases"].values():
-            if kumaoni_phrase in text.lower():
+            if kumaoni_phrase in text_lower:
                 kumaoni_count += 3  # Give more weight to phrases
         
         if kumaoni_count > hinglish_count:
@@ -275,44 +530,37 @@ class KumaoniChatbot:
         else:
             return "hinglish"
     
-    def detect_intent(self, text):
+    def detect_intent(self, text, text_lower=None):
         """Detect the intent of the user's message"""
-        text_lower = text.lower()
+        return self._detect_intent_cached(text_lower or text.lower())
+    
+    def _detect_intent_uncached(self, text_lower):
+        """Body of detect_intent, cached per instance on the lowercased text"""
+        # Find every keyword in one pass, then apply the intents in priority order
+        found = self.find_intent_keywords(text_lower)
         
         # Check for greetings
-        greeting_words = ["namaste", "namaskar", "hello", "hi", "hey", "good morning", "good evening", "kaise ho", "kas cha"]
-        for word in greeting_words:
-            if word in text_lower:
-                return "greeting"
+        if found & self._GREETING_WORDS:
+            return "greeting"
         
         # Check for questions about the bot
-        if "kaun" in text_lower or "kya" in text_lower or "ke" in text_lower:
-            if "tum" in text_lower or "aap" in text_lower or "tu" in text_lower:
-                return "introduction"
-        
-        # Check for weather related queries
-        weather_words = ["mausam", "barish", "dhoop", "garmi", "sardi", "barf"]
-        for word in weather_words:
-            if word in text_lower:
-                return "weather"
-        
-        # Check for food related queries
-        food_words = ["khana", "khano", "bhojan", "vyanjan", "pakwan", "recipe", "swad"]
-        for word in food_words:
-            if word in text_lower:
-                return "food"
-        
-        # Check for culture related queries
-        culture_words = ["sanskriti", "tyohar", "parv", "lok", "geet", "nritya", "parampara"]
-        for word in culture_words:
-            if word in text_lower:
-                return "culture"
+        if found & self._QUESTION_WORDS and found & self._ADDRESSEE_WORDS:
+            return "introduction"
+        
+        # Check for weather, food and culture related queries
+        for intent, keywords in self._TOPIC_WORDS:
+            if found & keywords:
+                return intent
         
         # Default to unknown intent
         return "unknown"
     
     def translate_word(self, word, direction="hinglish_to_kumaoni"):
         """Translate a single word"""
+        return self._translate_word_cached(word, direction, self._data_version)
+    
+    def _translate_word_uncached(self, word, direction, data_version):
+        """Body of translate_word, cached per instance on the word, direction and data version"""
         word_lower = word.lower().strip(".,?!\"'")
         
         if direction == "hinglish_to_kumaoni":
@@ -332,46 +580,31 @@ class KumaoniChatbot:
             if word_lower in self.data["vocab"]:
                 return self.data["vocab"][word_lower]
             
-            # Check verb endings
-            for ending, replacement in self.data["grammar"]["verb_endings"].items():
-                if word_lower.endswith(ending) and len(word_lower) > len(ending):
-                    return word_lower[:-len(ending)] + replacement
+            # Check verb endings (longest matching ending wins)
+            match = self._ending_re.search(word_lower) if self._ending_re is not None else None
+            if match:
+                return word_lower[:match.start()] + self.data["grammar"]["verb_endings"][match.group(1)]
             
             # No translation found
             return word
         else:  # kumaoni_to_hinglish
-            # Check reverse mappings
-            for hinglish, kumaoni in self.data["vocab"].items():
-                if kumaoni.lower() == word_lower:
-                    return hinglish
-            
-            # Check reverse pronouns
-            for hinglish, kumaoni in self.data["grammar"]["pronouns"].items():
-                if kumaoni.lower() == word_lower:
-                    return hinglish
-            
-            # Check reverse question words
-            for hinglish, kumaoni in self.data["grammar"]["question_words"].items():
-                if kumaoni.lower() == word_lower:
-                    return hinglish
-            
-            # Check reverse postpositions
-            for hinglish, kumaoni in self.data["grammar"]["postpositions"].items():
-                if kumaoni.lower() == word_lower:
-                    return hinglish
+            # Check reverse mappings, then reverse pronouns, question words and postpositions
+            for table in ("vocab", "pronouns", "question_words", "postpositions"):
+                if word_lower in self._rev[table]:
+                    return self._rev[table][word_lower]
             
             # No translation found
             return word
     
     def translate_phrase(self, phrase, direction="hinglish_to_kumaoni"):
         """Translate a phrase"""
+        phrase_lower = phrase.lower()
         if direction == "hinglish_to_kumaoni":
-            if phrase.lower() in self.data["phrases"]:
-                return self.data["phrases"][phrase.lower()]
+            if phrase_lower in self.data["phrases"]:
+                return self.data["phrases"][phrase_lower]
         else:  # kumaoni_to_hinglish
-            for hinglish, kumaoni in self.data["phrases"].items():
-                if kumaoni.lower() == phrase.lower():
-                    return hinglish
+            if phrase_lower in self._rev["phrases"]:
+                return self._rev["phrases"][phrase_lower]
         
         # No direct phrase translation, translate word by word
         words = phrase.split()
@@ -380,28 +613,35 @@ class KumaoniChatbot:
     
     def translate(self, text, direction="hinglish_to_kumaoni"):
         """Translate text between Hinglish and Kumaoni"""
-        # Check for full phrase matches first
+        return self._translate_cached(text, direction, self._data_version)
+    
+    def _translate_uncached(self, text, direction, data_version):
+        """Body of translate, cached per instance on the text, direction and data version"""
+        # Replace full phrase matches first, in a single pass (longest phrase wins)
         if direction == "hinglish_to_kumaoni":
-            for phrase in self.data["phrases"]:
-                if phrase.lower() in text.lower():
-                    text = text.lower().replace(phrase.lower(), self.data["phrases"][phrase])
+            pattern, substitutions, automaton = self._phrase_re_h2k, self._phrase_sub_h2k, self._phrase_ac_h2k
         else:  # kumaoni_to_hinglish
-            for hinglish, kumaoni in self.data["phrases"].items():
-                if kumaoni.lower() in text.lower():
-                    text = text.lower().replace(kumaoni.lower(), hinglish)
+            pattern, substitutions, automaton = self._phrase_re_k2h, self._phrase_sub_k2h, self._phrase_ac_k2h
         
-        # Translate remaining words
-        words = text.split()
-        translated_words = [self.translate_word(word, direction) for word in words]
-        return " ".join(translated_words)
+        substituted = self.substitute_phrases(text, automaton) if automaton is not None else None
+        if substituted is not None:
+            text = substituted
+        elif pattern is not None:
+            text = pattern.sub(lambda m: substitutions[m.group(1).lower()], text)
+        
+        # Translate remaining words in place
+        return WORD_RE.sub(lambda m: self.translate_word(m.group(0), direction), text)
     
     def get_response(self, user_input):
         """Generate a response to the user input"""
+        # Lowercase the input once for both detectors
+        user_input_lower = user_input.lower()
+        
         # Detect language of input
-        input_language = self.detect_language(user_input)
+        input_language = self.detect_language(user_input, user_input_lower)
         
         # Detect intent
-        intent = self.detect_intent(user_input)
+        intent = self.detect_intent(user_input, user_input_lower)
         
         # Update conversation context
         self.conversation_context["current_topic"] = intent
@@ -412,13 +652,10 @@ class KumaoniChatbot:
             "timestamp": datetime.datetime.now().isoformat()
         })
         
-        # Get appropriate response based on intent
-        if intent in self.data["chat_responses"]:
-            responses = self.data["chat_responses"][intent]
-            response = random.choice(responses)
-        else:
-            responses = self.data["chat_responses"]["unknown"]
-            response = random.choice(responses)
+        # Get appropriate response based on intent, cycling through its shuffled pool
+        pool = self._response_pools.get(intent) or self._response_pools["unknown"]
+        response = pool[0]
+        pool.rotate(-1)
         
         # Choose response language based on user preference or input language
         if self.conversation_context["language_preference"] == "kumaoni":
@@ -439,47 +676,103 @@ class KumaoniChatbot:
         self.conversation_context["exchanges"][-1]["bot"] = bot_response
         self.conversation_context["exchanges"][-1]["bot_language"] = response_language
         
-        # Save conversation history periodically
-        if len(self.conversation_context["exchanges"]) % 10 == 0:
-            self.save_conversation_history()
+        # Append the exchange to this session's history file
+        self.append_exchange(self.conversation_context["exchanges"][-1])
         
+        # The translation is only computed if the caller actually uses it
+        direction = "kumaoni_to_hinglish" if response_language == "kumaoni" else "hinglish_to_kumaoni"
         return {
             "text": bot_response,
             "language": response_language,
             "intent": intent,
-            "translation": self.translate(bot_response, 
-                                         "kumaoni_to_hinglish" if response_language == "kumaoni" else "hinglish_to_kumaoni")
+            "translation": _LazyStr(lambda: self.translate(bot_response, direction))
         }
     
     def learn_new_word(self, hinglish, kumaoni):
         """Learn a new word mapping"""
         hinglish = hinglish.lower().strip()
         self.data["vocab"][hinglish] = kumaoni
-        self.save_json(VOCAB_MAP_PATH, self.data["vocab"])
+        self._rev["vocab"] = self.reverse_mapping(self.data["vocab"])
+        self._vocab_values = set(self.data["vocab"].values())
+        self._data_version += 1
+        if self.learned_log.append("word", hinglish, kumaoni):
+            self.compact_learned_log()
         return f"Learned new word: {hinglish} → {kumaoni}"
     
     def learn_new_phrase(self, hinglish, kumaoni):
         """Learn a new phrase mapping"""
         hinglish = hinglish.lower().strip()
         self.data["phrases"][hinglish] = kumaoni
-        self.save_json(PHRASES_PATH, self.data["phrases"])
+        self._rev["phrases"] = self.reverse_mapping(self.data["phrases"])
+        self.build_phrase_patterns()
+        self._data_version += 1
+        if self.learned_log.append("phrase", hinglish, kumaoni):
+            self.compact_learned_log()
         return f"Learned new phrase: {hinglish} → {kumaoni}"
     
+    def append_exchange(self, exchange):
+        """Append one exchange to the current session's history file"""
+        try:
+            if self._history_file is None:
+                os.makedirs(HISTORY_DIR, exist_ok=True)
+                history_path = os.path.join(HISTORY_DIR, f"{self.session_id}.jsonl")
+                self._history_file = open(history_path, 'a', encoding='utf-8')
+            
+            self._history_file.write(dumps_json(exchange, indent=False).decode('utf-8') + "\n")
+            
+            # Flush periodically
+            if len(self.conversation_context["exchanges"]) % HISTORY_FLUSH_EVERY == 0:
+                self._history_file.flush()
+        except Exception as e:
+            print(f"Error saving conversation history: {e}")
+    
     def save_conversation_history(self):
         """Save the current conversation history"""
-        if self.session_id not in [s["session_id"] for s in self.data["history"]["sessions"]]:
-            self.data["history"]["sessions"].append({
-                "session_id": self.session_id,
-                "start_time": self.conversation_context["exchanges"][0]["timestamp"] if self.conversation_context["exchanges"] else datetime.datetime.now().isoformat(),
-                "exchanges": self.conversation_context["exchanges"]
-            })
-        else:
-            for session in self.data["history"]["sessions"]:
-                if session["session_id"] == self.session_id:
-                    session["exchanges"] = self.conversation_context["exchanges"]
-                    break
+        if self._history_file is not None:
+            self._history_file.flush()
+    
+    def history_session_files(self):
+        """Paths of the per-session history files, oldest first"""
+        if not os.path.isdir(HISTORY_DIR):
+            return []
+        return sorted(os.path.join(HISTORY_DIR, name) for name in os.listdir(HISTORY_DIR) if name.endswith(".jsonl"))
+    
+    def load_history(self):
+        """Load conversation_history.json with sessions keyed by session_id"""
+        history = self.load_json(CONVERSATION_HISTORY_PATH, {"sessions": {}})
+        
+        # Migrate the old list-of-sessions layout
+        if isinstance(history["sessions"], list):
+            history["sessions"] = {session["session_id"]: session for session in history["sessions"]}
         
-        self.save_json(CONVERSATION_HISTORY_PATH, self.data["history"])
+        return history
+    
+    def compact_history(self):
+        """Merge the per-session history files into conversation_history.json"""
+        history = self.load_history()
+        sessions = history["sessions"]
+        merged = []
+        
+        for path in self.history_session_files():
+            with open(path, 'r', encoding='utf-8') as f:
+                exchanges = [loads_json(line) for line in f if line.strip()]
+            if exchanges:
+                session_id = os.path.splitext(os.path.basename(path))[0]
+                if session_id in sessions:
+                    sessions[session_id]["exchanges"].extend(exchanges)
+                else:
+                    sessions[session_id] = {
+                        "session_id": session_id,
+                        "start_time": exchanges[0]["timestamp"],
+                        "exchanges": exchanges
+                    }
+            merged.append(path)
+        
+        if merged and self.save_json(CONVERSATION_HISTORY_PATH, history):
+            for path in merged:
+                os.remove(path)
+        
+        return len(merged)
     
     def set_language_preference(self, preference):
         """Set the language preference for responses"""
@@ -494,10 +787,11 @@ class KumaoniChatbot:
         return {
             "vocabulary_size": len(self.data["vocab"]),
             "phrases_count": len(self.data["phrases"]),
-            "idioms_count": len(self.data["idioms"]),
-            "conversation_templates": sum(len(templates) for templates in self.data["conversations"].values()),
+            "idioms_count": len(self.idioms),
+            "conversation_templates": sum(len(templates) for templates in self.conversations.values()),
             "response_patterns": sum(len(responses) for responses in self.data["chat_responses"].values()),
-            "conversation_history": len(self.data["history"]["sessions"]),
+            "conversation_history": (len(self.load_history()["sessions"])
+                                     + len(self.history_session_files())),
             "current_session_exchanges": len(self.conversation_context["exchanges"])
         }
 
@@ -527,6 +821,8 @@ def main():
                         help="Set the language preference for responses")
     parser.add_argument("--learn", action="store_true", help="Enter learning mode to teach new words and phrases")
     parser.add_argument("--stats", action="store_true", help="Show statistics about the chatbot's knowledge")
+    parser.add_argument("--compact-history", action="store_true",
+                        help="Merge per-session history files into conversation_history.json")
     
     args = parser.parse_args()
     
@@ -536,6 +832,11 @@ def main():
     # Set language preference
     chatbot.set_language_preference(args.language)
     
+    if args.compact_history:
+        merged = chatbot.compact_history()
+        print(f"Merged {merged} session history files into {CONVERSATION_HISTORY_PATH}")
+        return
+    
     if args.stats:
         stats = chatbot.get_stats()
         print("\nKumaoni Chatbot Statistics:")
@@ -573,6 +874,7 @@ def main():
             else:
                 print("Invalid option. Use 'word', 'phrase', or 'exit'.")
         
+        chatbot.close()
         return
     
     # Start conversation
@@ -593,6 +895,7 @@ def main():
         if user_input.lower() == "exit":
             # Save conversation history before exiting
             chatbot.save_conversation_history()
+            chatbot.close()
             print("Goodbye! Phir bhetula!")
             break
         
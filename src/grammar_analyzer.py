@@ -6,10 +6,19 @@ for the Kumaoni language to improve the chatbot's grammar recognition.
 """
 
 import os
-import json
 import argparse
 import re
 from collections import defaultdict, Counter
+from functools import lru_cache
+from operator import itemgetter
+
+from jsonio import loads_json, load_json, save_json
+
+# pyahocorasick is optional - pattern keywords fall back to a word set intersection
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -21,26 +30,47 @@ VERB_FORMS_PATH = os.path.join(DATA_DIR, "verb_forms.json")
 NOUN_FORMS_PATH = os.path.join(DATA_DIR, "noun_forms.json")
 SENTENCE_STRUCTURES_PATH = os.path.join(DATA_DIR, "sentence_structures.json")
 
+# Punctuation stripped from the ends of each word before analysis
+PUNCTUATION = ".,?!\"'"
+
+# Words inside a sentence, for keyword matching on word boundaries
+WORD_RE = re.compile(r"[\w']+")
+
+def _argmax(counts):
+    """Most common key of a Counter, first seen winning ties (as most_common(1) does, without the heap)"""
+    return max(counts.items(), key=itemgetter(1))[0]
+
 class GrammarAnalyzer:
     def __init__(self):
         """Initialize the grammar analyzer"""
+        # Sentence structures repeat across the dataset, so cache them per instance
+        # (an lru_cache on the method would be shared by every instance and keep each one alive)
+        self.get_sentence_structure = lru_cache(maxsize=65536)(self._get_sentence_structure_uncached)
+        
         # Create data directory if it doesn't exist
         os.makedirs(DATA_DIR, exist_ok=True)
         
         # Load dataset
         self.dataset = self.load_dataset()
+        # Lowercased and split sentences, built on first use and shared by every analysis
+        self._lowered = None
+        self._tokenized = None
+        self._pair_counts = None
         
         # Initialize grammar components
-        self.grammar_rules = self.load_json(GRAMMAR_RULES_PATH, {})
-        self.patterns = self.load_json(PATTERNS_PATH, {})
-        self.verb_forms = self.load_json(VERB_FORMS_PATH, {})
-        self.noun_forms = self.load_json(NOUN_FORMS_PATH, {})
-        self.sentence_structures = self.load_json(SENTENCE_STRUCTURES_PATH, {})
+        self.grammar_rules = load_json(GRAMMAR_RULES_PATH, {})
+        self.patterns = load_json(PATTERNS_PATH, {})
+        self.verb_forms = load_json(VERB_FORMS_PATH, {})
+        self.noun_forms = load_json(NOUN_FORMS_PATH, {})
+        self.sentence_structures = load_json(SENTENCE_STRUCTURES_PATH, {})
         
         # Common verb endings in Hindi/Hinglish
         self.hinglish_verb_endings = ["na", "ta", "te", "ti", "ya", "ye", "yi", "a", "e", "i", "o", "u"]
         self.kumaoni_verb_endings = ["no", "to", "ta", "ti", "yo", "ya", "yi", "o", "a", "i", "u"]
         
+        # Common verb roots in Hindi/Hinglish
+        self.common_verbs = ["kar", "ho", "ja", "aa", "de", "le", "bol", "dekh", "sun", "kha", "pi", "so", "mil", "likh", "padh"]
+        
         # Common postpositions
         self.hinglish_postpositions = ["ka", "ke", "ki", "ko", "se", "me", "par", "tak"]
         self.kumaoni_postpositions = ["ko", "ka", "ki", "ku", "le", "ma", "par", "tak"]
@@ -51,198 +81,198 @@ class GrammarAnalyzer:
         
         # Common question words
         self.hinglish_question_words = ["kya", "kaun", "kahan", "kaise", "kyun", "kitna", "kitne", "kitni", "kab"]
+        
+        # Sets of the word lists above, for O(1) membership checks
+        self._hinglish_postpositions_set = frozenset(self.hinglish_postpositions)
+        self._hinglish_pronouns_set = frozenset(self.hinglish_pronouns)
+        self._hinglish_question_words_set = frozenset(self.hinglish_question_words)
+        
+        # Reversed tries of the verb endings, so one walk from the end of a word finds every match
+        self._hinglish_endings_trie = self.build_affix_trie(self.hinglish_verb_endings, reverse=True)
+        self._kumaoni_endings_trie = self.build_affix_trie(self.kumaoni_verb_endings, reverse=True)
+        # Prefix trie of the verb roots, so overlapping roots like "de" and "dekh" are found in one walk
+        self._common_verbs_trie = self.build_affix_trie(self.common_verbs)
+        
+        # Keywords for categorizing patterns, in priority order
+        self.pattern_keywords = [
+            ("greetings", ["namaste", "namaskar", "hello", "hi", "kaise", "kas", "shubh"]),
+            ("farewells", ["alvida", "phir", "milenge", "bhetula", "shubh", "ratri", "rati"]),
+            ("questions", self.hinglish_question_words)
+        ]
+        self._pattern_automaton = self.build_pattern_automaton()
+    
+    def build_affix_trie(self, affixes, reverse=False):
+        """Build a character trie of the affixes (reversed for suffixes), remembering each one's list position"""
+        trie = {}
+        for rank, affix in enumerate(affixes):
+            node = trie
+            for char in (reversed(affix) if reverse else affix):
+                node = node.setdefault(char, {})
+            # None marks the end of an affix; characters are never None
+            node.setdefault(None, (rank, affix))
+        return trie
+    
+    def match_affixes(self, word, trie, reverse=False, proper=False):
+        """Return the affixes the word starts (or, if reverse, ends) with, in list order"""
+        matches = []
+        node = trie
+        for depth, char in enumerate(reversed(word) if reverse else word, 1):
+            node = node.get(char)
+            if node is None:
+                break
+            # A proper affix leaves at least one character of the word
+            if None in node and not (proper and depth == len(word)):
+                matches.append(node[None])
+        matches.sort()
+        return [affix for _, affix in matches]
+    
+    def build_pattern_automaton(self):
+        """Build an Aho-Corasick automaton over the space-delimited pattern keywords, if available"""
+        if ahocorasick is None:
+            return None
+        
+        categories = defaultdict(set)
+        for category, keywords in self.pattern_keywords:
+            for keyword in keywords:
+                categories[keyword].add(category)
+        
+        automaton = ahocorasick.Automaton()
+        for keyword, keyword_categories in categories.items():
+            automaton.add_word(f" {keyword} ", frozenset(keyword_categories))
+        automaton.make_automaton()
+        return automaton
+    
+    def pattern_categories(self, text_lower):
+        """Return the pattern categories whose keywords occur as whole words in the text"""
+        words = WORD_RE.findall(text_lower)
+        
+        if self._pattern_automaton is not None:
+            found = set()
+            for _, keyword_categories in self._pattern_automaton.iter(" " + " ".join(words) + " "):
+                found |= keyword_categories
+            return found
+        
+        words = set(words)
+        return {category for category, keywords in self.pattern_keywords if not words.isdisjoint(keywords)}
     
     def load_dataset(self):
         """Load the dataset"""
-        if os.path.exists(DATASET_PATH):
-            with open(DATASET_PATH, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            print(f"Loaded dataset with {len(data)} examples")
-            return data
-        else:
+        try:
+            with open(DATASET_PATH, 'rb') as f:
+                data = loads_json(f.read())
+        except FileNotFoundError:
             print(f"Dataset not found at {DATASET_PATH}")
             return []
+        print(f"Loaded dataset with {len(data)} examples")
+        return data
     
-    def load_json(self, file_path, default_value):
-        """Load JSON data from file, or return default if file doesn't exist"""
-        try:
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            else:
-                return default_value
-        except Exception as e:
-            print(f"Error loading {file_path}: {e}")
-            return default_value
+    def lowered_dataset(self):
+        """Return the (hinglish, kumaoni) sentences of every item, lowercased once per run"""
+        if self._lowered is None:
+            self._lowered = [(item["hinglish"].lower(), item["kumaoni"].lower()) for item in self.dataset]
+        return self._lowered
     
-    def save_json(self, file_path, data):
-        """Save JSON data to file"""
-        try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            return True
-        except Exception as e:
-            print(f"Error saving {file_path}: {e}")
-            return False
+    def tokenized_dataset(self):
+        """Return the (hinglish_words, kumaoni_words) of every item, lowercased and split once per run"""
+        if self._tokenized is None:
+            self._tokenized = [(hinglish.split(), kumaoni.split()) for hinglish, kumaoni in self.lowered_dataset()]
+        return self._tokenized
     
-    def analyze_verb_endings(self):
-        """Analyze verb endings in the dataset"""
-        verb_endings_map = defaultdict(Counter)
-        
-        for item in self.dataset:
-            hinglish = item["hinglish"]
-            kumaoni = item["kumaoni"]
-            
-            hinglish_words = hinglish.split()
-            kumaoni_words = kumaoni.split()
-            
+    def iter_aligned_pairs(self):
+        """Yield normalized (hinglish_word, kumaoni_word) pairs from items whose word counts match"""
+        for hinglish_words, kumaoni_words in self.tokenized_dataset():
             # Only process if the number of words match (for direct mapping)
             if len(hinglish_words) == len(kumaoni_words):
                 for h_word, k_word in zip(hinglish_words, kumaoni_words):
-                    h_word = h_word.lower().strip(".,?!\"'")
-                    k_word = k_word.lower().strip(".,?!\"'")
-                    
-                    # Check for verb endings
-                    for h_ending in self.hinglish_verb_endings:
-                        if h_word.endswith(h_ending) and len(h_word) > len(h_ending):
-                            # Find the corresponding Kumaoni ending
-                            for k_ending in self.kumaoni_verb_endings:
-                                if k_word.endswith(k_ending) and len(k_word) > len(k_ending):
-                                    verb_endings_map[h_ending][k_ending] += 1
-        
-        # Convert to most common endings
-        verb_endings = {}
-        for h_ending, k_endings in verb_endings_map.items():
-            if k_endings:
-                most_common = k_endings.most_common(1)[0]
-                verb_endings[h_ending] = most_common[0]
-        
-        return verb_endings
+                    yield h_word.strip(PUNCTUATION), k_word.strip(PUNCTUATION)
     
-    def analyze_postpositions(self):
-        """Analyze postpositions in the dataset"""
+    def aligned_pair_counts(self):
+        """Count each distinct aligned word pair once per run, in order of first occurrence"""
+        if self._pair_counts is None:
+            self._pair_counts = Counter(self.iter_aligned_pairs())
+        return self._pair_counts
+    
+    def most_common_translations(self, counts_map):
+        """Reduce a mapping of Counters to the most common value for each key"""
+        result = {}
+        for key, counts in counts_map.items():
+            if counts:
+                result[key] = _argmax(counts)
+        return result
+    
+    def analyze_all(self):
+        """Analyze verb endings, postpositions, pronouns and question words in one pass over the dataset"""
+        verb_endings_map = defaultdict(Counter)
         postpositions_map = defaultdict(Counter)
+        pronouns_map = defaultdict(Counter)
+        question_words_map = defaultdict(Counter)
         
-        for item in self.dataset:
-            hinglish = item["hinglish"]
-            kumaoni = item["kumaoni"]
+        # Analyze each distinct pair once, weighted by how often it occurs
+        for (h_word, k_word), count in self.aligned_pair_counts().items():
+            # Check for verb endings
+            h_endings = self.match_affixes(h_word, self._hinglish_endings_trie, reverse=True, proper=True)
+            if h_endings:
+                # Find the corresponding Kumaoni endings
+                k_endings = self.match_affixes(k_word, self._kumaoni_endings_trie, reverse=True, proper=True)
+                for h_ending in h_endings:
+                    for k_ending in k_endings:
+                        verb_endings_map[h_ending][k_ending] += count
             
-            hinglish_words = hinglish.split()
-            kumaoni_words = kumaoni.split()
+            # Check for postpositions
+            if h_word in self._hinglish_postpositions_set:
+                postpositions_map[h_word][k_word] += count
             
-            # Only process if the number of words match (for direct mapping)
-            if len(hinglish_words) == len(kumaoni_words):
-                for h_word, k_word in zip(hinglish_words, kumaoni_words):
-                    h_word = h_word.lower().strip(".,?!\"'")
-                    k_word = k_word.lower().strip(".,?!\"'")
-                    
-                    # Check for postpositions
-                    if h_word in self.hinglish_postpositions:
-                        postpositions_map[h_word][k_word] += 1
-        
-        # Convert to most common postpositions
-        postpositions = {}
-        for h_post, k_posts in postpositions_map.items():
-            if k_posts:
-                most_common = k_posts.most_common(1)[0]
-                postpositions[h_post] = most_common[0]
-        
-        return postpositions
+            # Check for pronouns
+            if h_word in self._hinglish_pronouns_set:
+                pronouns_map[h_word][k_word] += count
+            
+            # Check for question words
+            if h_word in self._hinglish_question_words_set:
+                question_words_map[h_word][k_word] += count
+        
+        # Convert to the most common translation of each
+        return {
+            "verb_endings": self.most_common_translations(verb_endings_map),
+            "postpositions": self.most_common_translations(postpositions_map),
+            "pronouns": self.most_common_translations(pronouns_map),
+            "question_words": self.most_common_translations(question_words_map)
+        }
+    
+    def analyze_verb_endings(self):
+        """Analyze verb endings in the dataset"""
+        return self.analyze_all()["verb_endings"]
+    
+    def analyze_postpositions(self):
+        """Analyze postpositions in the dataset"""
+        return self.analyze_all()["postpositions"]
     
     def analyze_pronouns(self):
         """Analyze pronouns in the dataset"""
-        pronouns_map = defaultdict(Counter)
-        
-        for item in self.dataset:
-            hinglish = item["hinglish"]
-            kumaoni = item["kumaoni"]
-            
-            hinglish_words = hinglish.split()
-            kumaoni_words = kumaoni.split()
-            
-            # Only process if the number of words match (for direct mapping)
-            if len(hinglish_words) == len(kumaoni_words):
-                for h_word, k_word in zip(hinglish_words, kumaoni_words):
-                    h_word = h_word.lower().strip(".,?!\"'")
-                    k_word = k_word.lower().strip(".,?!\"'")
-                    
-                    # Check for pronouns
-                    if h_word in self.hinglish_pronouns:
-                        pronouns_map[h_word][k_word] += 1
-        
-        # Convert to most common pronouns
-        pronouns = {}
-        for h_pron, k_prons in pronouns_map.items():
-            if k_prons:
-                most_common = k_prons.most_common(1)[0]
-                pronouns[h_pron] = most_common[0]
-        
-        return pronouns
+        return self.analyze_all()["pronouns"]
     
     def analyze_question_words(self):
         """Analyze question words in the dataset"""
-        question_words_map = defaultdict(Counter)
-        
-        for item in self.dataset:
-            hinglish = item["hinglish"]
-            kumaoni = item["kumaoni"]
-            
-            hinglish_words = hinglish.split()
-            kumaoni_words = kumaoni.split()
-            
-            # Only process if the number of words match (for direct mapping)
-            if len(hinglish_words) == len(kumaoni_words):
-                for h_word, k_word in zip(hinglish_words, kumaoni_words):
-                    h_word = h_word.lower().strip(".,?!\"'")
-                    k_word = k_word.lower().strip(".,?!\"'")
-                    
-                    # Check for question words
-                    if h_word in self.hinglish_question_words:
-                        question_words_map[h_word][k_word] += 1
-        
-        # Convert to most common question words
-        question_words = {}
-        for h_qw, k_qws in question_words_map.items():
-            if k_qws:
-                most_common = k_qws.most_common(1)[0]
-                question_words[h_qw] = most_common[0]
-        
-        return question_words
+        return self.analyze_all()["question_words"]
     
     def analyze_verb_forms(self):
         """Analyze verb forms in the dataset"""
-        verb_forms = defaultdict(lambda: defaultdict(Counter))
+        # One flat counter keyed by (verb, suffix, kumaoni_word)
+        verb_forms = Counter()
         
-        # Common verb roots in Hindi/Hinglish
-        common_verbs = ["kar", "ho", "ja", "aa", "de", "le", "bol", "dekh", "sun", "kha", "pi", "so", "mil", "likh", "padh"]
+        for (h_word, k_word), count in self.aligned_pair_counts().items():
+            # Check for verb forms
+            for verb in self.match_affixes(h_word, self._common_verbs_trie):
+                suffix = h_word[len(verb):]
+                verb_forms[(verb, suffix, k_word)] += count
         
-        for item in self.dataset:
-            hinglish = item["hinglish"]
-            kumaoni = item["kumaoni"]
-            
-            hinglish_words = hinglish.split()
-            kumaoni_words = kumaoni.split()
-            
-            # Only process if the number of words match (for direct mapping)
-            if len(hinglish_words) == len(kumaoni_words):
-                for h_word, k_word in zip(hinglish_words, kumaoni_words):
-                    h_word = h_word.lower().strip(".,?!\"'")
-                    k_word = k_word.lower().strip(".,?!\"'")
-                    
-                    # Check for verb forms
-                    for verb in common_verbs:
-                        if h_word.startswith(verb):
-                            suffix = h_word[len(verb):]
-                            verb_forms[verb][suffix][k_word] += 1
-        
-        # Convert to most common forms
+        # Group into the most common form per verb and suffix in one sweep (first seen wins ties)
         result = {}
-        for verb, suffixes in verb_forms.items():
-            result[verb] = {}
-            for suffix, translations in suffixes.items():
-                if translations:
-                    most_common = translations.most_common(1)[0]
-                    result[verb][suffix] = most_common[0]
+        best_counts = {}
+        for (verb, suffix, k_word), count in verb_forms.items():
+            suffixes = result.setdefault(verb, {})
+            if count > best_counts.get((verb, suffix), 0):
+                best_counts[(verb, suffix)] = count
+                suffixes[suffix] = k_word
         
         return result
     
@@ -261,25 +291,19 @@ class GrammarAnalyzer:
             structures[h_structure][k_structure] += 1
         
         # Convert to most common structures
-        result = {}
-        for h_struct, k_structs in structures.items():
-            if k_structs:
-                most_common = k_structs.most_common(1)[0]
-                result[h_struct] = most_common[0]
-        
-        return result
+        return self.most_common_translations(structures)
     
-    def get_sentence_structure(self, sentence):
-        """Get the basic structure of a sentence (simplified)"""
+    def _get_sentence_structure_uncached(self, sentence):
+        """Get the basic structure of a sentence (simplified); cached per instance as get_sentence_structure"""
         # This is a simplified approach - in a real system, you'd use POS tagging
         words = sentence.lower().split()
         
         # Check for question
-        if any(qw in words for qw in self.hinglish_question_words):
+        if not self._hinglish_question_words_set.isdisjoint(words):
             return "question"
         
         # Check for command (imperative)
-        if len(words) > 0 and words[0] not in self.hinglish_pronouns:
+        if len(words) > 0 and words[0] not in self._hinglish_pronouns_set:
             for verb_ending in ["o", "en", "iye"]:
                 if words[0].endswith(verb_ending):
                     return "command"
@@ -289,17 +313,8 @@ class GrammarAnalyzer:
     
     def analyze_grammar(self):
         """Analyze grammar patterns in the dataset"""
-        print("Analyzing verb endings...")
-        verb_endings = self.analyze_verb_endings()
-        
-        print("Analyzing postpositions...")
-        postpositions = self.analyze_postpositions()
-        
-        print("Analyzing pronouns...")
-        pronouns = self.analyze_pronouns()
-        
-        print("Analyzing question words...")
-        question_words = self.analyze_question_words()
+        print("Analyzing verb endings, postpositions, pronouns and question words...")
+        word_rules = self.analyze_all()
         
         print("Analyzing verb forms...")
         verb_forms = self.analyze_verb_forms()
@@ -309,16 +324,16 @@ class GrammarAnalyzer:
         
         # Compile grammar rules
         grammar_rules = {
-            "verb_endings": verb_endings,
-            "postpositions": postpositions,
-            "pronouns": pronouns,
-            "question_words": question_words
+            "verb_endings": word_rules["verb_endings"],
+            "postpositions": word_rules["postpositions"],
+            "pronouns": word_rules["pronouns"],
+            "question_words": word_rules["question_words"]
         }
         
         # Save results
-        self.save_json(GRAMMAR_RULES_PATH, grammar_rules)
-        self.save_json(VERB_FORMS_PATH, verb_forms)
-        self.save_json(SENTENCE_STRUCTURES_PATH, sentence_structures)
+        save_json(GRAMMAR_RULES_PATH, grammar_rules)
+        save_json(VERB_FORMS_PATH, verb_forms)
+        save_json(SENTENCE_STRUCTURES_PATH, sentence_structures)
         
         print(f"Saved grammar rules to {GRAMMAR_RULES_PATH}")
         print(f"Saved verb forms to {VERB_FORMS_PATH}")
@@ -339,29 +354,23 @@ class GrammarAnalyzer:
             "statements": []
         }
         
-        # Keywords for categorization
-        greeting_words = ["namaste", "namaskar", "hello", "hi", "kaise", "kas", "shubh"]
-        farewell_words = ["alvida", "phir", "milenge", "bhetula", "shubh", "ratri", "rati"]
-        question_indicators = self.hinglish_question_words
-        
-        for item in self.dataset:
+        for item, (hinglish_lower, _) in zip(self.dataset, self.lowered_dataset()):
             hinglish = item["hinglish"]
             kumaoni = item["kumaoni"]
             
-            hinglish_lower = hinglish.lower()
-            
-            # Categorize by pattern
-            if any(word in hinglish_lower for word in greeting_words):
+            # Categorize by pattern, matching every keyword in one pass
+            categories = self.pattern_categories(hinglish_lower)
+            if "greetings" in categories:
                 patterns["greetings"].append({"hinglish": hinglish, "kumaoni": kumaoni})
-            elif any(word in hinglish_lower for word in farewell_words):
+            elif "farewells" in categories:
                 patterns["farewells"].append({"hinglish": hinglish, "kumaoni": kumaoni})
-            elif any(word in hinglish_lower for word in question_indicators) or hinglish_lower.endswith("?"):
+            elif "questions" in categories or hinglish_lower.endswith("?"):
                 patterns["questions"].append({"hinglish": hinglish, "kumaoni": kumaoni})
             else:
                 patterns["statements"].append({"hinglish": hinglish, "kumaoni": kumaoni})
         
         # Save patterns
-        self.save_json(PATTERNS_PATH, patterns)
+        save_json(PATTERNS_PATH, patterns)
         print(f"Saved patterns to {PATTERNS_PATH}")
         
         # Print statistics
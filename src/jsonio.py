@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+JSON helpers shared by the Kumaoni chatbot tools.
+Uses orjson when it is installed and falls back to the json module,
+producing the same bytes either way.
+"""
+
+import os
+import json
+
+# orjson is optional - it parses and serializes several times faster than json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def loads_json(raw):
+    """Parse JSON from bytes or str, using orjson when available"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def dumps_json(data, indent=True):
+    """Serialize data to UTF-8 JSON bytes, using orjson when available"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(data, option=option)
+    return json.dumps(data, ensure_ascii=False, indent=2 if indent else None).encode('utf-8')
+
+def load_json(file_path, default_value, create=False):
+    """Load JSON data from file, or return default if file doesn't exist (writing it first if create is set)"""
+    try:
+        with open(file_path, 'rb') as f:
+            return loads_json(f.read())
+    except FileNotFoundError:
+        if create:
+            write_json(file_path, dumps_json(default_value))
+        return default_value
+    except Exception as e:
+        print(f"Error loading {file_path}: {e}")
+        return default_value
+
+def write_bytes(file_path, payload):
+    """Atomically replace file_path with the given bytes, returning whether it succeeded"""
+    try:
+        # Write a sibling temp file and rename it over the target, so a crash never leaves a torn file
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+        return True
+    except Exception as e:
+        print(f"Error saving {file_path}: {e}")
+        return False
+
+def write_json(file_path, payload):
+    """Atomically replace file_path with the given JSON bytes, returning whether it succeeded"""
+    return write_bytes(file_path, payload)
+
+def save_json(file_path, data):
+    """Save JSON data to file"""
+    return write_json(file_path, dumps_json(data))
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Append-only log of learned words and phrases, shared by the chatbot and the
+training module. Each learned entry is one JSON line, so learning never
+rewrites vocab_mapping.json or phrases_mapping.json; the log is folded into
+those files (and truncated) on compaction. Anything that reads the two JSON
+files should replay the log on top of them.
+"""
+
+import os
+
+from jsonio import loads_json, dumps_json
+
+# Paths
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+VOCAB_MAP_PATH = os.path.join(DATA_DIR, "vocab_mapping.json")
+PHRASES_PATH = os.path.join(DATA_DIR, "phrases_mapping.json")
+LEARNED_WAL_PATH = os.path.join(DATA_DIR, "learned.wal.jsonl")
+
+# fsync the log every WAL_FSYNC_EVERY entries; compact it once it holds WAL_COMPACT_EVERY
+WAL_FSYNC_EVERY = 32
+WAL_COMPACT_EVERY = 1000
+
+class LearnedLog:
+    """The learned words/phrases log at path, opened for appending on first write"""
+
+    def __init__(self, path=LEARNED_WAL_PATH):
+        self.path = path
+        # Entries in the log since the last compaction
+        self.writes = 0
+        self._file = None
+
+    def __getstate__(self):
+        # Pickled with the chatbot's state cache; the open file handle is not
+        state = self.__dict__.copy()
+        state["_file"] = None
+        return state
+
+    def replay(self, data):
+        """Apply the log's entries to data["vocab"] and data["phrases"], returning how many there were"""
+        count = 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = loads_json(line)
+                    except ValueError:
+                        continue  # torn last line from an interrupted write
+                    table = "vocab" if entry["type"] == "word" else "phrases"
+                    data[table][entry["hinglish"]] = entry["kumaoni"]
+                    count += 1
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error loading {self.path}: {e}")
+
+        self.writes = count
+        return count
+
+    def append(self, entry_type, hinglish, kumaoni):
+        """Append one learned word/phrase, returning whether the log is due for compaction"""
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+        entry = {"type": entry_type, "hinglish": hinglish, "kumaoni": kumaoni}
+        self._file.write(dumps_json(entry, indent=False).decode('utf-8') + "\n")
+        self._file.flush()
+        self.writes += 1
+
+        if self.writes % WAL_FSYNC_EVERY == 0:
+            os.fsync(self._file.fileno())
+        return self.writes >= WAL_COMPACT_EVERY
+
+    def compact(self, data, save_json):
+        """Save data["vocab"] and data["phrases"] with save_json(path, value), then truncate the log
+
+        The log is kept if either save fails, so nothing learned is lost.
+        """
+        if self.writes == 0:
+            return
+
+        saved = save_json(VOCAB_MAP_PATH, data["vocab"])
+        saved = save_json(PHRASES_PATH, data["phrases"]) and saved
+        if not saved:
+            return
+
+        self.close()
+        open(self.path, 'w', encoding='utf-8').close()
+        self.writes = 0
+
+    def close(self):
+        """Close the log file if it is open"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
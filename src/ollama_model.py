@@ -5,10 +5,15 @@ This script creates an Ollama model that integrates the Kumaoni chatbot capabili
 """
 
 import os
-import json
 import argparse
 import subprocess
 import shutil
+import string
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+
+from jsonio import load_json, save_json, write_bytes
+from learned_log import LearnedLog
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -21,6 +26,42 @@ EXPRESSIONS_PATH = os.path.join(DATA_DIR, "expressions.json")
 MODELFILE_PATH = os.path.join(BASE_DIR, "Modelfile")
 OLLAMA_DIR = os.path.join(BASE_DIR, "ollama_model")
 
+# Ollama keeps only the last SYSTEM instruction, so the prompt and the data share one
+MODELFILE_TEMPLATE = string.Template('''
+FROM $base_model
+
+# Kumaoni Chatbot Model
+# $description
+
+# System prompt that instructs the model how to use the Kumaoni language capabilities,
+# followed by the Kumaoni language data
+SYSTEM """$system_prompt
+$data_prompt"""
+
+# Parameters to control the model behavior
+PARAMETER temperature 0.7
+PARAMETER top_p 0.9
+PARAMETER top_k 40
+PARAMETER num_ctx 4096
+
+# Include the full Kumaoni language data file
+FILE kumaoni_data.json $data_path
+''')
+
+def link_or_copy(src_path, dst_path):
+    """Hard-link src_path to dst_path when both are on one filesystem, copying otherwise
+
+    Only safe for files whose writers replace them by rename (write_bytes),
+    never by rewriting in place, or the linked copy would change too.
+    """
+    # Replace any earlier copy so the link always points at the current file
+    if os.path.lexists(dst_path):
+        os.remove(dst_path)
+    try:
+        os.link(src_path, dst_path)
+    except OSError:
+        shutil.copyfile(src_path, dst_path)
+
 class OllamaModelCreator:
     def __init__(self):
         """Initialize the Ollama model creator"""
@@ -28,31 +69,24 @@ class OllamaModelCreator:
         os.makedirs(DATA_DIR, exist_ok=True)
         os.makedirs(OLLAMA_DIR, exist_ok=True)
         
-        # Load data files
-        self.data = {
-            "vocab": self.load_json(VOCAB_MAP_PATH, {}),
-            "phrases": self.load_json(PHRASES_PATH, {}),
-            "grammar": self.load_json(GRAMMAR_RULES_PATH, {}),
-            "idioms": self.load_json(IDIOMS_PATH, {}),
-            "expressions": self.load_json(EXPRESSIONS_PATH, {})
+        # Load data files concurrently, since each read waits on disk I/O
+        paths = {
+            "vocab": VOCAB_MAP_PATH,
+            "phrases": PHRASES_PATH,
+            "grammar": GRAMMAR_RULES_PATH,
+            "idioms": IDIOMS_PATH,
+            "expressions": EXPRESSIONS_PATH
         }
+        with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+            self.data = dict(zip(paths, executor.map(lambda path: load_json(path, {}), paths.values())))
+        
+        # Words/phrases learned since the last compaction are only in the learned log
+        LearnedLog().replay(self.data)
         
         print(f"Loaded vocabulary with {len(self.data['vocab'])} words")
         print(f"Loaded phrases with {len(self.data['phrases'])} phrases")
         print(f"Loaded {len(self.data['idioms'])} idioms")
     
-    def load_json(self, file_path, default_value):
-        """Load JSON data from file, or return default if file doesn't exist"""
-        try:
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            else:
-                return default_value
-        except Exception as e:
-            print(f"Error loading {file_path}: {e}")
-            return default_value
-    
     def create_modelfile(self, base_model, model_name, description):
         """Create a Modelfile for Ollama"""
         # Create a compact version of the data for embedding in the model
@@ -65,20 +99,9 @@ class OllamaModelCreator:
         
         # Save compact data to a file in the Ollama model directory
         compact_data_path = os.path.join(OLLAMA_DIR, "kumaoni_data.json")
-        with open(compact_data_path, 'w', encoding='utf-8') as f:
-            json.dump(compact_data, f, ensure_ascii=False, indent=2)
-        
-        # Create the Modelfile content
-        modelfile_content = f"""
-FROM {base_model}
-
-# Kumaoni Chatbot Model
-# {description}
-
-# System prompt that instructs the model how to use the Kumaoni language capabilities
-SYSTEM """
+        save_json(compact_data_path, compact_data)
         
-        # Add the system prompt
+        # The system prompt
         system_prompt = f"""
 You are a helpful Kumaoni language chatbot that can:
 1. Translate between Hinglish and Kumaoni languages
@@ -126,68 +149,49 @@ Word mapping:
 Kumaoni: "mero nau John ch"
 """
         
-        modelfile_content += f'"""{system_prompt}"""\n\n'
-        
-        # Add parameters to control the model behavior
-        modelfile_content += """
-# Parameters to control the model behavior
-PARAMETER temperature 0.7
-PARAMETER top_p 0.9
-PARAMETER top_k 40
-PARAMETER num_ctx 4096
-
-# Include the Kumaoni language data
-SYSTEM """
-        
-        # Add a simplified version of the data as a system message
-        data_prompt = "Here is the Kumaoni language data you can use:\n\n"
+        # A simplified version of the data for the system message
+        data_parts = ["Here is the Kumaoni language data you can use:\n\n"]
         
         # Add some example vocabulary
-        data_prompt += "Example vocabulary (Hinglish → Kumaoni):\n"
-        vocab_sample = dict(list(self.data["vocab"].items())[:20])  # First 20 items
-        for hinglish, kumaoni in vocab_sample.items():
-            data_prompt += f"- {hinglish} → {kumaoni}\n"
+        data_parts.append("Example vocabulary (Hinglish → Kumaoni):\n")
+        for hinglish, kumaoni in islice(self.data["vocab"].items(), 20):  # First 20 items
+            data_parts.append(f"- {hinglish} → {kumaoni}\n")
         
         # Add some example phrases
-        data_prompt += "\nExample phrases (Hinglish → Kumaoni):\n"
-        phrases_sample = dict(list(self.data["phrases"].items())[:10])  # First 10 items
-        for hinglish, kumaoni in phrases_sample.items():
-            data_prompt += f"- {hinglish} → {kumaoni}\n"
+        data_parts.append("\nExample phrases (Hinglish → Kumaoni):\n")
+        for hinglish, kumaoni in islice(self.data["phrases"].items(), 10):  # First 10 items
+            data_parts.append(f"- {hinglish} → {kumaoni}\n")
         
         # Add some example idioms
-        data_prompt += "\nExample idioms (Kumaoni → Meaning):\n"
-        idioms_sample = dict(list(self.data["idioms"].items())[:10])  # First 10 items
-        for kumaoni, meaning in idioms_sample.items():
-            data_prompt += f"- {kumaoni} → {meaning}\n"
+        data_parts.append("\nExample idioms (Kumaoni → Meaning):\n")
+        for kumaoni, meaning in islice(self.data["idioms"].items(), 10):  # First 10 items
+            data_parts.append(f"- {kumaoni} → {meaning}\n")
         
         # Add grammar rules
-        data_prompt += "\nGrammar rules:\n"
+        data_parts.append("\nGrammar rules:\n")
         for category, rules in self.data["grammar"].items():
-            data_prompt += f"- {category}:\n"
-            rules_sample = dict(list(rules.items())[:5])  # First 5 items
-            for hinglish, kumaoni in rules_sample.items():
-                data_prompt += f"  - {hinglish} → {kumaoni}\n"
+            data_parts.append(f"- {category}:\n")
+            for hinglish, kumaoni in islice(rules.items(), 5):  # First 5 items
+                data_parts.append(f"  - {hinglish} → {kumaoni}\n")
         
-        modelfile_content += f'"""{data_prompt}"""\n\n'
+        modelfile_content = MODELFILE_TEMPLATE.substitute(
+            base_model=base_model,
+            description=description,
+            system_prompt=system_prompt,
+            data_prompt="".join(data_parts),
+            data_path=os.path.relpath(compact_data_path, BASE_DIR)
+        )
         
-        # Add the data file
-        modelfile_content += f"""
-# Include the full Kumaoni language data file
-FILE kumaoni_data.json {os.path.relpath(compact_data_path, BASE_DIR)}
-"""
-        
-        # Write the Modelfile
-        with open(MODELFILE_PATH, 'w', encoding='utf-8') as f:
-            f.write(modelfile_content)
-        
-        print(f"Created Modelfile at {MODELFILE_PATH}")
+        # Replace the Modelfile by rename rather than rewriting it in place, so
+        # packages that hard-linked an earlier Modelfile keep their own copy
+        if write_bytes(MODELFILE_PATH, modelfile_content.encode('utf-8')):
+            print(f"Created Modelfile at {MODELFILE_PATH}")
     
     def create_model(self, model_name):
         """Create the Ollama model"""
         try:
             # Check if Ollama is installed
-            result = subprocess.run(["which", "ollama"], capture_output=True, text=True)
-            if result.returncode != 0:
+            if shutil.which("ollama") is None:
                 print("Ollama is not installed. Please install Ollama first.")
                 return False
             
@@ -215,19 +219,23 @@ FILE kumaoni_data.json {os.path.relpath(compact_data_path, BASE_DIR)}
             os.makedirs(output_dir, exist_ok=True)
             
             # Copy Modelfile
-            shutil.copy(MODELFILE_PATH, os.path.join(output_dir, "Modelfile"))
+            link_or_copy(MODELFILE_PATH, os.path.join(output_dir, "Modelfile"))
             
             # Copy data files
             data_dir = os.path.join(output_dir, "data")
             os.makedirs(data_dir, exist_ok=True)
             
-            for file_name in ["vocab_mapping.json", "phrases_mapping.json", "grammar_rules.json", "idioms.json"]:
+            # vocab and phrases are written from self.data, which includes entries so far only in the learned log
+            save_json(os.path.join(data_dir, "vocab_mapping.json"), self.data["vocab"])
+            save_json(os.path.join(data_dir, "phrases_mapping.json"), self.data["phrases"])
+            
+            for file_name in ["grammar_rules.json", "idioms.json"]:
                 src_path = os.path.join(DATA_DIR, file_name)
                 if os.path.exists(src_path):
-                    shutil.copy(src_path, os.path.join(data_dir, file_name))
+                    link_or_copy(src_path, os.path.join(data_dir, file_name))
             
             # Copy kumaoni_data.json
-            shutil.copy(os.path.join(OLLAMA_DIR, "kumaoni_data.json"), os.path.join(output_dir, "kumaoni_data.json"))
+            link_or_copy(os.path.join(OLLAMA_DIR, "kumaoni_data.json"), os.path.join(output_dir, "kumaoni_data.json"))
             
             # Create README.md
             readme_content = f"""# Kumaoni Chatbot Ollama Model
@@ -6,10 +6,29 @@ It helps the chatbot understand and generate more natural Kumaoni language.
 """
 
 import os
-import json
 import argparse
+import pickle
 import re
-from collections import defaultdict, Counter
+from collections import defaultdict, deque, Counter
+from operator import itemgetter
+from bisect import bisect_right
+from heapq import nlargest
+from itertools import chain, islice
+from concurrent.futures import ProcessPoolExecutor
+
+from jsonio import loads_json, load_json, save_json
+
+# ijson is optional - it lets the extractors stream the dataset instead of loading it whole
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# pyahocorasick is optional - the recognizer falls back to word tries and sets
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -19,87 +38,368 @@ PATTERNS_PATH = os.path.join(DATA_DIR, "patterns.json")
 IDIOMS_PATH = os.path.join(DATA_DIR, "idioms.json")
 EXPRESSIONS_PATH = os.path.join(DATA_DIR, "expressions.json")
 COLLOCATIONS_PATH = os.path.join(DATA_DIR, "collocations.json")
+# Pickled recognize_patterns lookup tables, reused while the pattern files are unchanged
+PATTERN_CACHE_PATH = os.path.join(DATA_DIR, ".cache", "patterns.pkl")
+PATTERN_CACHE_VERSION = 2
+PATTERN_SOURCE_PATHS = [IDIOMS_PATH, EXPRESSIONS_PATH, COLLOCATIONS_PATH]
+PATTERN_CACHE_ATTRS = ["_collocates", "_pattern_entries", "_pattern_automaton", "_pattern_trie"]
+
+WORD_RE = re.compile(r"\w+")
+
+# Datasets larger than one shard are accumulated in parallel worker processes
+SHARD_SIZE = 20000
 
 class PatternRecognizer:
+    # Keywords for categorizing expressions, in priority order
+    CATEGORY_WORDS = {
+        "greetings": ["namaste", "namaskar", "hello", "hi", "kaise", "kas", "shubh"],
+        "farewells": ["alvida", "phir", "milenge", "bhetula", "shubh", "ratri", "rati"],
+        "thanks": ["dhanyavaad", "shukriya", "thanks"],
+        "apologies": ["maaf", "maph", "sorry", "kshama"],
+        "questions": ["kya", "kaun", "kahan", "kaise", "kyun", "kitna", "kitne", "kitni", "kab", 
+                      "ke", "ko", "kakh", "kas", "kya", "kati"],
+        "affirmations": ["haan", "ho", "yes", "theek", "thik", "sahi"],
+        "negations": ["nahi", "na", "no", "mat"]
+    }
+    
     def __init__(self):
         """Initialize the pattern recognizer"""
         # Create data directory if it doesn't exist
         os.makedirs(DATA_DIR, exist_ok=True)
         
-        # Load dataset
-        self.dataset = self.load_dataset()
+        # Pattern components, loaded on first access since --analyze never reads them
+        self._patterns = None
+        self._idioms = None
+        self._expressions = None
+        self._collocations = None
         
-        # Initialize pattern components
-        self.patterns = self.load_json(PATTERNS_PATH, {})
-        self.idioms = self.load_json(IDIOMS_PATH, {})
-        self.expressions = self.load_json(EXPRESSIONS_PATH, {})
-        self.collocations = self.load_json(COLLOCATIONS_PATH, {})
+        # Raw dataset counts, filled by the first extractor that runs
+        self._accumulated = None
+        
+        # Lookup structures for recognize_patterns, built on its first call
+        self._collocates = None
+        self._pattern_entries = self._pattern_automaton = self._pattern_trie = None
+        
+        # One automaton over every category keyword, for extract_expressions
+        self._category_automaton = self.build_category_automaton()
+        
+        # Keyword set per category, used when pyahocorasick is missing
+        self._category_sets = {category: frozenset(words) for category, words in self.CATEGORY_WORDS.items()}
+    
+    @property
+    def patterns(self):
+        """Speech patterns, loaded from patterns.json on first access"""
+        if self._patterns is None:
+            self._patterns = self.load_json(PATTERNS_PATH, {})
+        return self._patterns
+    
+    @property
+    def idioms(self):
+        """Kumaoni idioms, loaded from idioms.json on first access"""
+        if self._idioms is None:
+            self._idioms = self.load_json(IDIOMS_PATH, {})
+        return self._idioms
+    
+    @property
+    def expressions(self):
+        """Categorized expressions, loaded from expressions.json on first access"""
+        if self._expressions is None:
+            self._expressions = self.load_json(EXPRESSIONS_PATH, {})
+        return self._expressions
+    
+    @property
+    def collocations(self):
+        """Word collocations, loaded from collocations.json on first access"""
+        if self._collocations is None:
+            self._collocations = self.load_json(COLLOCATIONS_PATH, {})
+        return self._collocations
+    
+    def pattern_cache_key(self):
+        """Modification times of every file the cached lookup tables are built from"""
+        key = {"version": PATTERN_CACHE_VERSION, "ahocorasick": ahocorasick is not None}
+        for path in PATTERN_SOURCE_PATHS:
+            try:
+                key[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                key[path] = None
+        return key
+    
+    def load_pattern_cache(self):
+        """Restore the recognize_patterns lookup tables from the pattern cache, if it is up to date"""
+        try:
+            with open(PATTERN_CACHE_PATH, 'rb') as f:
+                cached = pickle.load(f)
+        except Exception:
+            return False
+        
+        if cached.get("key") != self.pattern_cache_key():
+            return False
+        
+        self.__dict__.update(cached["state"])
+        return True
+    
+    def save_pattern_cache(self):
+        """Pickle the recognize_patterns lookup tables for the next run"""
+        try:
+            os.makedirs(os.path.dirname(PATTERN_CACHE_PATH), exist_ok=True)
+            state = {attr: getattr(self, attr) for attr in PATTERN_CACHE_ATTRS}
+            with open(PATTERN_CACHE_PATH, 'wb') as f:
+                pickle.dump({"key": self.pattern_cache_key(), "state": state}, f, protocol=5)
+        except Exception as e:
+            print(f"Error saving {PATTERN_CACHE_PATH}: {e}")
+    
+    def build_category_automaton(self):
+        """Build an Aho-Corasick automaton mapping each space-delimited category keyword to its categories, if available"""
+        if ahocorasick is None:
+            return None
+        
+        keyword_categories = defaultdict(list)
+        for category, words in self.CATEGORY_WORDS.items():
+            for word in words:
+                if category not in keyword_categories[word]:
+                    keyword_categories[word].append(category)
+        
+        automaton = ahocorasick.Automaton()
+        for word, categories in keyword_categories.items():
+            automaton.add_word(f" {word} ", tuple(categories))
+        automaton.make_automaton()
+        return automaton
+    
+    def categorize_expression(self, hinglish_lower, kumaoni_lower):
+        """Return the first category with a keyword as a whole word in either lowercase text, or None"""
+        if self._category_automaton is not None:
+            # Collect every category hit in one scan of each text, padded so only whole words match
+            hits = set()
+            for text in (hinglish_lower, kumaoni_lower):
+                for _, categories in self._category_automaton.iter(" " + " ".join(WORD_RE.findall(text)) + " "):
+                    hits.update(categories)
+            if hinglish_lower.endswith("?"):
+                hits.add("questions")
+            for category in self.CATEGORY_WORDS:
+                if category in hits:
+                    return category
+            return None
+        
+        # Tokenize both texts once and intersect the words with each category's keywords
+        words = set(WORD_RE.findall(hinglish_lower))
+        words.update(WORD_RE.findall(kumaoni_lower))
+        for category, keywords in self._category_sets.items():
+            if not keywords.isdisjoint(words):
+                return category
+            if category == "questions" and hinglish_lower.endswith("?"):
+                return category
+        return None
+    
+    def expression_pairs(self, expressions_list):
+        """Return the (hinglish, kumaoni) pairs of one category, from parallel lists or older per-item dicts"""
+        if isinstance(expressions_list, dict):
+            return zip(expressions_list["hinglish"], expressions_list["kumaoni"])
+        return [(expression["hinglish"], expression["kumaoni"]) for expression in expressions_list]
+    
+    def build_pattern_index(self):
+        """Index the idioms and expressions by their lowercase words, for recognize_patterns"""
+        # Entries in the order recognize_patterns reports them
+        entries = [("idioms", {"idiom": idiom, "meaning": meaning}) for idiom, meaning in self.idioms.items()]
+        entries += [
+            ("expressions", {"expression": kumaoni, "hinglish": hinglish, "category": category})
+            for category, expressions_list in self.expressions.items()
+            for hinglish, kumaoni in self.expression_pairs(expressions_list)
+        ]
+        
+        # Patterns match as whole words, so each is keyed by its words joined with single spaces
+        keys = defaultdict(list)
+        for index, (kind, result) in enumerate(entries):
+            words = WORD_RE.findall((result["idiom"] if kind == "idioms" else result["expression"]).lower())
+            if words:
+                keys[" ".join(words)].append(index)
+        
+        if ahocorasick is not None and keys:
+            automaton = ahocorasick.Automaton()
+            for key, indices in keys.items():
+                automaton.add_word(f" {key} ", indices)
+            automaton.make_automaton()
+            return entries, automaton, None
+        
+        # Without pyahocorasick, walk a trie of the pattern words from each position of the text
+        trie = {}
+        for key, indices in keys.items():
+            node = trie
+            for word in key.split(" "):
+                node = node.setdefault(word, {})
+            # None marks the end of a pattern; words are never None
+            node[None] = indices
+        return entries, None, trie
     
     def load_dataset(self):
-        """Load the dataset"""
-        if os.path.exists(DATASET_PATH):
-            with open(DATASET_PATH, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            print(f"Loaded dataset with {len(data)} examples")
-            return data
-        else:
+        """Yield the dataset items one at a time, streaming them with ijson when available"""
+        try:
+            f = open(DATASET_PATH, 'rb')
+        except FileNotFoundError:
             print(f"Dataset not found at {DATASET_PATH}")
-            return []
+            return
+        with f:
+            if ijson is not None:
+                yield from ijson.items(f, "item")
+            else:
+                yield from loads_json(f.read())
+    
+    def has_dataset(self):
+        """Check whether the dataset has at least one example"""
+        if ijson is not None:
+            return next(self.load_dataset(), None) is not None
+        
+        # Without ijson, peek past the opening bracket rather than parsing the whole file
+        try:
+            with open(DATASET_PATH, 'rb') as f:
+                head = f.read(4096).lstrip()
+        except FileNotFoundError:
+            print(f"Dataset not found at {DATASET_PATH}")
+            return False
+        return head[:1] == b"[" and head[1:].lstrip()[:1] not in (b"]", b"")
     
     def load_json(self, file_path, default_value):
         """Load JSON data from file, or return default if file doesn't exist"""
-        try:
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            else:
-                return default_value
-        except Exception as e:
-            print(f"Error loading {file_path}: {e}")
-            return default_value
+        return load_json(file_path, default_value)
     
     def save_json(self, file_path, data):
         """Save JSON data to file"""
-        try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            return True
-        except Exception as e:
-            print(f"Error saving {file_path}: {e}")
-            return False
+        return save_json(file_path, data)
     
-    def extract_idioms(self):
-        """Extract idioms from the dataset"""
-        # Idioms are expressions that have meanings different from their literal meanings
-        # We'll look for phrases that appear multiple times with consistent translations
+    def accumulate_patterns(self):
+        """Walk the dataset once, collecting the raw counts for every extractor"""
+        if self._accumulated is not None:
+            return self._accumulated
         
-        # First, collect all phrases (2-4 words) from Kumaoni text
-        kumaoni_phrases = defaultdict(list)
+        items = self.load_dataset()
+        first_shard = list(islice(items, SHARD_SIZE))
+        workers = os.cpu_count() or 1
         
-        for item in self.dataset:
+        if len(first_shard) < SHARD_SIZE or workers < 2:
+            # A single shard is not worth starting worker processes for
+            self._accumulated = self.accumulate_items(chain(first_shard, items))
+        else:
+            # Accumulate each shard in a worker process, then merge the shards in dataset order
+            shards = chain([first_shard], iter(lambda: list(islice(items, SHARD_SIZE)), []))
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_shard_worker) as executor:
+                results = map_bounded(executor, accumulate_shard, shards, 2 * workers)
+                self._accumulated = self.merge_accumulated(results)
+        
+        return self._accumulated
+    
+    def accumulate_items(self, items):
+        """Collect the raw counts for every extractor from the given dataset items"""
+        # Words and translations are interned to integer ids once, so phrases are keyed by
+        # tuples of small ints and each phrase counts translation ids instead of listing strings
+        vocab = {}
+        translation_ids = {}
+        # One counter per phrase length, plus how many distinct phrases each held after every
+        # sentence, so extract_idioms can restore the order phrases were first seen in
+        phrase_translations = {n: defaultdict(Counter) for n in (2, 3, 4)}
+        phrase_sentences = {n: [] for n in (2, 3, 4)}
+        # Each category keeps parallel hinglish/kumaoni lists rather than a dict per expression
+        expressions = {category: {"hinglish": [], "kumaoni": []} for category in self.CATEGORY_WORDS}
+        # Collocations count (word, next word) pairs in one flat Counter
+        collocations = Counter()
+        # Bound methods hoisted out of the window loop
+        bigram_counter = phrase_translations[2].__getitem__
+        trigram_counter = phrase_translations[3].__getitem__
+        fourgram_counter = phrase_translations[4].__getitem__
+        word_id = vocab.setdefault
+        
+        for item in items:
             hinglish = item["hinglish"]
             kumaoni = item["kumaoni"]
+            kumaoni_lower = kumaoni.lower()
+            
+            # Idioms: phrases of 2-4 words
+            kumaoni_ids = tuple([word_id(word, len(vocab)) for word in kumaoni.split()])
+            translation_id = translation_ids.setdefault(hinglish, len(translation_ids))
             
-            kumaoni_words = kumaoni.split()
+            # One rolling window emits the 2-, 3- and 4-word phrases starting at each position
+            length = len(kumaoni_ids)
+            for i in range(length - 1):
+                bigram_counter(kumaoni_ids[i:i+2])[translation_id] += 1
+                if i + 3 <= length:
+                    trigram_counter(kumaoni_ids[i:i+3])[translation_id] += 1
+                    if i + 4 <= length:
+                        fourgram_counter(kumaoni_ids[i:i+4])[translation_id] += 1
+            for n, counts in phrase_translations.items():
+                phrase_sentences[n].append(len(counts))
             
-            # Extract phrases of 2-4 words
-            for n in range(2, 5):
-                if len(kumaoni_words) >= n:
-                    for i in range(len(kumaoni_words) - n + 1):
-                        phrase = " ".join(kumaoni_words[i:i+n])
-                        kumaoni_phrases[phrase].append(hinglish)
+            # Expressions: categorize by function
+            category = self.categorize_expression(hinglish.lower(), kumaoni_lower)
+            if category is not None:
+                expressions[category]["hinglish"].append(hinglish)
+                expressions[category]["kumaoni"].append(kumaoni)
+            
+            # Collocations: pairs of lowercase words
+            kumaoni_words = kumaoni_lower.split()
+            collocations.update(zip(kumaoni_words, kumaoni_words[1:]))
+        
+        return list(vocab), list(translation_ids), phrase_translations, phrase_sentences, expressions, collocations
+    
+    def merge_accumulated(self, parts):
+        """Merge the raw counts of consecutive dataset shards, as if they were collected in one pass"""
+        vocab = {}
+        translation_ids = {}
+        phrase_translations = {n: defaultdict(Counter) for n in (2, 3, 4)}
+        phrase_sentences = {n: [] for n in (2, 3, 4)}
+        expressions = {category: {"hinglish": [], "kumaoni": []} for category in self.CATEGORY_WORDS}
+        collocations = Counter()
+        
+        for words, translations, part_phrases, part_sentences, part_expressions, part_collocations in parts:
+            # Map the shard's own word and translation ids onto the merged ones
+            word_ids = [vocab.setdefault(word, len(vocab)) for word in words]
+            part_translation_ids = [translation_ids.setdefault(translation, len(translation_ids)) for translation in translations]
+            
+            for n, counts in part_phrases.items():
+                merged = phrase_translations[n]
+                merged_before = len(merged)
+                # new_phrases[rank] is how many of the shard's first rank phrases were new to the merge
+                new_phrases = [0]
+                for phrase_ids, translation_counter in counts.items():
+                    key = tuple([word_ids[index] for index in phrase_ids])
+                    is_new = key not in merged
+                    merged_counter = merged[key]
+                    for translation_id, count in translation_counter.items():
+                        merged_counter[part_translation_ids[translation_id]] += count
+                    new_phrases.append(new_phrases[-1] + is_new)
+                phrase_sentences[n].extend(merged_before + new_phrases[seen] for seen in part_sentences[n])
+            
+            for category, exps in part_expressions.items():
+                expressions[category]["hinglish"].extend(exps["hinglish"])
+                expressions[category]["kumaoni"].extend(exps["kumaoni"])
+            
+            collocations.update(part_collocations)
+        
+        return list(vocab), list(translation_ids), phrase_translations, phrase_sentences, expressions, collocations
+    
+    def extract_idioms(self):
+        """Extract idioms from the dataset"""
+        # Idioms are expressions that have meanings different from their literal meanings
+        # We'll look for phrases that appear multiple times with consistent translations
+        words, translations_by_id, phrase_translations, phrase_sentences, _, _ = self.accumulate_patterns()
         
         # Filter for phrases that appear multiple times with consistent translations
-        idioms = {}
-        for phrase, translations in kumaoni_phrases.items():
-            if len(translations) >= 3:  # Appears at least 3 times
-                # Check if translations are consistent
-                translation_counter = Counter(translations)
-                most_common = translation_counter.most_common(1)[0]
-                
-                # If the most common translation appears in at least 70% of cases
-                if most_common[1] / len(translations) >= 0.7:
-                    idioms[phrase] = most_common[0]
+        survivors = []
+        for n, counts in phrase_translations.items():
+            for rank, (phrase_ids, translation_counter) in enumerate(counts.items()):
+                total = sum(translation_counter.values())
+                if total >= 3:  # Appears at least 3 times
+                    # Check if translations are consistent (ties go to the first translation seen)
+                    translation_id, count = max(translation_counter.items(), key=itemgetter(1))
+                    
+                    # If the most common translation appears in at least 70% of cases
+                    if count / total >= 0.7:
+                        # Order by the sentence the phrase first appeared in, then length, then position
+                        sentence = bisect_right(phrase_sentences[n], rank)
+                        survivors.append((sentence, n, rank, phrase_ids, translation_id))
+        
+        survivors.sort()
+        idioms = {
+            " ".join([words[index] for index in phrase_ids]): translations_by_id[translation_id]
+            for _, _, _, phrase_ids, translation_id in survivors
+        }
         
         # Save idioms
         self.save_json(IDIOMS_PATH, idioms)
@@ -111,88 +411,44 @@ class PatternRecognizer:
         """Extract common expressions from the dataset"""
         # Expressions are common phrases used in specific contexts
         # We'll categorize them by context/function
-        
+        _, _, _, _, categorized, _ = self.accumulate_patterns()
         expressions = {
-            "greetings": [],
-            "farewells": [],
-            "thanks": [],
-            "apologies": [],
-            "questions": [],
-            "affirmations": [],
-            "negations": []
+            category: {"hinglish": list(exps["hinglish"]), "kumaoni": list(exps["kumaoni"])}
+            for category, exps in categorized.items()
         }
         
-        # Keywords for categorization
-        greeting_words = ["namaste", "namaskar", "hello", "hi", "kaise", "kas", "shubh"]
-        farewell_words = ["alvida", "phir", "milenge", "bhetula", "shubh", "ratri", "rati"]
-        thanks_words = ["dhanyavaad", "shukriya", "thanks"]
-        apology_words = ["maaf", "maph", "sorry", "kshama"]
-        question_words = ["kya", "kaun", "kahan", "kaise", "kyun", "kitna", "kitne", "kitni", "kab", 
-                         "ke", "ko", "kakh", "kas", "kya", "kati"]
-        affirmation_words = ["haan", "ho", "yes", "theek", "thik", "sahi"]
-        negation_words = ["nahi", "na", "no", "mat"]
-        
-        for item in self.dataset:
-            hinglish = item["hinglish"]
-            kumaoni = item["kumaoni"]
-            
-            hinglish_lower = hinglish.lower()
-            kumaoni_lower = kumaoni.lower()
-            
-            # Categorize by function
-            if any(word in hinglish_lower for word in greeting_words) or any(word in kumaoni_lower for word in greeting_words):
-                expressions["greetings"].append({"hinglish": hinglish, "kumaoni": kumaoni})
-            elif any(word in hinglish_lower for word in farewell_words) or any(word in kumaoni_lower for word in farewell_words):
-                expressions["farewells"].append({"hinglish": hinglish, "kumaoni": kumaoni})
-            elif any(word in hinglish_lower for word in thanks_words) or any(word in kumaoni_lower for word in thanks_words):
-                expressions["thanks"].append({"hinglish": hinglish, "kumaoni": kumaoni})
-            elif any(word in hinglish_lower for word in apology_words) or any(word in kumaoni_lower for word in apology_words):
-                expressions["apologies"].append({"hinglish": hinglish, "kumaoni": kumaoni})
-            elif any(word in hinglish_lower for word in question_words) or any(word in kumaoni_lower for word in question_words) or hinglish_lower.endswith("?"):
-                expressions["questions"].append({"hinglish": hinglish, "kumaoni": kumaoni})
-            elif any(word in hinglish_lower for word in affirmation_words) or any(word in kumaoni_lower for word in affirmation_words):
-                expressions["affirmations"].append({"hinglish": hinglish, "kumaoni": kumaoni})
-            elif any(word in hinglish_lower for word in negation_words) or any(word in kumaoni_lower for word in negation_words):
-                expressions["negations"].append({"hinglish": hinglish, "kumaoni": kumaoni})
-        
         # Save expressions
         self.save_json(EXPRESSIONS_PATH, expressions)
         
         # Print statistics
-        total_expressions = sum(len(exps) for exps in expressions.values())
+        total_expressions = sum(map(len, map(itemgetter("kumaoni"), expressions.values())))
         print(f"Saved {total_expressions} expressions to {EXPRESSIONS_PATH}")
         for category, exps in expressions.items():
-            print(f"  - {category}: {len(exps)} expressions")
+            print(f"  - {category}: {len(exps['kumaoni'])} expressions")
         
         return expressions
     
     def extract_collocations(self):
         """Extract word collocations from the dataset"""
         # Collocations are words that commonly appear together
+        _, _, _, _, _, collocations = self.accumulate_patterns()
         
-        collocations = defaultdict(Counter)
-        
-        for item in self.dataset:
-            kumaoni = item["kumaoni"]
-            kumaoni_words = kumaoni.lower().split()
-            
-            # Look for pairs of words
-            if len(kumaoni_words) >= 2:
-                for i in range(len(kumaoni_words) - 1):
-                    word = kumaoni_words[i]
-                    next_word = kumaoni_words[i + 1]
-                    collocations[word][next_word] += 1
+        # Group the pair counts by first word, keeping the order pairs were first seen in
+        co_words_by_word = defaultdict(list)
+        for (word, next_word), count in collocations.items():
+            co_words_by_word[word].append((next_word, count))
         
         # Filter for significant collocations
         result = {}
-        for word, co_words in collocations.items():
-            if len(co_words) >= 2:  # Word appears with at least 2 different words
-                # Get the top 3 collocations
-                top_collocations = co_words.most_common(3)
-                result[word] = [{"word": w, "count": c} for w, c in top_collocations if c >= 2]
-        
-        # Filter out words with no significant collocations
-        result = {word: colls for word, colls in result.items() if colls}
+        for word, co_words in co_words_by_word.items():
+            if len(co_words) < 2:  # Word must appear with at least 2 different words
+                continue
+            # Get the top 3 collocations (ties keep first-seen order, as in most_common)
+            top_collocations = nlargest(3, co_words, key=itemgetter(1))
+            colls = [{"word": w, "count": c} for w, c in top_collocations if c >= 2]
+            # Skip words with no significant collocations
+            if colls:
+                result[word] = colls
         
         # Save collocations
         self.save_json(COLLOCATIONS_PATH, result)
@@ -225,28 +481,41 @@ class PatternRecognizer:
             "collocations": []
         }
         
-        # Check for idioms
-        for idiom, meaning in self.idioms.items():
-            if idiom.lower() in text.lower():
-                results["idioms"].append({"idiom": idiom, "meaning": meaning})
-        
-        # Check for expressions
-        for category, expressions_list in self.expressions.items():
-            for expression in expressions_list:
-                if expression["kumaoni"].lower() in text.lower():
-                    results["expressions"].append({
-                        "expression": expression["kumaoni"],
-                        "hinglish": expression["hinglish"],
-                        "category": category
-                    })
+        if self._pattern_entries is None and not self.load_pattern_cache():
+            # Set of known collocates for each word
+            self._collocates = {
+                word: frozenset(item["word"] for item in items) for word, items in self.collocations.items()
+            }
+            # One automaton (or word trie) over every idiom and expression
+            self._pattern_entries, self._pattern_automaton, self._pattern_trie = self.build_pattern_index()
+            self.save_pattern_cache()
+        
+        # Find every idiom and expression as whole words, then report them in their original order
+        text_lower = text.lower()
+        words = WORD_RE.findall(text_lower)
+        found = set()
+        if self._pattern_automaton is not None:
+            for _, indices in self._pattern_automaton.iter(" " + " ".join(words) + " "):
+                found.update(indices)
+        else:
+            for start in range(len(words)):
+                node = self._pattern_trie
+                for word in words[start:]:
+                    node = node.get(word)
+                    if node is None:
+                        break
+                    if None in node:
+                        found.update(node[None])
+        for index in sorted(found):
+            kind, result = self._pattern_entries[index]
+            results[kind].append(dict(result))
         
         # Check for collocations
-        words = text.lower().split()
-        for i in range(len(words) - 1):
-            word = words[i]
-            next_word = words[i + 1]
-            
-            if word in self.collocations and any(item["word"] == next_word for item in self.collocations[word]):
+        words = text_lower.split()
+        collocates = self._collocates
+        for word, next_word in zip(words, words[1:]):
+            known = collocates.get(word)
+            if known is not None and next_word in known:
                 results["collocations"].append({
                     "word": word,
                     "collocate": next_word
@@ -254,6 +523,29 @@ class PatternRecognizer:
         
         return results
 
+# Recognizer the worker processes of accumulate_patterns accumulate their shards with
+_shard_recognizer = None
+
+def init_shard_worker():
+    """Create the recognizer for a worker process"""
+    global _shard_recognizer
+    _shard_recognizer = PatternRecognizer()
+
+def accumulate_shard(items):
+    """Collect the raw pattern counts of one dataset shard in a worker process"""
+    return _shard_recognizer.accumulate_items(items)
+
+def map_bounded(executor, fn, iterable, window):
+    """Yield fn(item) for each item in order, like executor.map, but with at most window
+    calls in flight, so a streamed iterable is only read as fast as results are consumed"""
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
 def main():
     parser = argparse.ArgumentParser(description="Pattern Recognizer for Kumaoni language")
     parser.add_argument("--analyze", action="store_true", help="Analyze patterns in the dataset")
@@ -263,7 +555,7 @@ def main():
     
     recognizer = PatternRecognizer()
     
-    if not recognizer.dataset and args.analyze:
+    if args.analyze and not recognizer.has_dataset():
         print("No dataset available. Cannot analyze patterns.")
         return
     
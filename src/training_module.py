@@ -6,11 +6,20 @@ new words, phrases, grammar rules, and corrections.
 """
 
 import os
-import json
+import sys
 import argparse
 import datetime
 from collections import defaultdict
 
+from jsonio import loads_json, dumps_json, load_json, save_json
+from learned_log import LearnedLog
+
+# ijson is optional - it lets the duplicate check stream the dataset instead of loading it whole
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
 # Paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, "data")
@@ -19,8 +28,19 @@ PHRASES_PATH = os.path.join(DATA_DIR, "phrases_mapping.json")
 GRAMMAR_RULES_PATH = os.path.join(DATA_DIR, "grammar_rules.json")
 IDIOMS_PATH = os.path.join(DATA_DIR, "idioms.json")
 TRAINING_LOG_PATH = os.path.join(DATA_DIR, "training_log.json")
+# Sessions are appended here one JSON line each; training_log.json is only read for older sessions
+TRAINING_LOG_JSONL_PATH = os.path.join(DATA_DIR, "training_log.jsonl")
 CORRECTIONS_PATH = os.path.join(DATA_DIR, "corrections.json")
 DATASET_PATH = os.path.join(DATA_DIR, "data.json")
+# File each self.data entry is flushed to, in flush order
+DATA_PATHS = {
+    "vocab": VOCAB_MAP_PATH,
+    "phrases": PHRASES_PATH,
+    "grammar": GRAMMAR_RULES_PATH,
+    "idioms": IDIOMS_PATH,
+    "corrections": CORRECTIONS_PATH,
+    "dataset": DATASET_PATH
+}
 
 # ANSI color codes for terminal output
 class Colors:
@@ -33,6 +53,44 @@ class Colors:
     ENDC = '\033[0m'
     BOLD = '\033[1m'
     UNDERLINE = '\033[4m'
+    
+    @classmethod
+    def disable(cls):
+        """Turn every color code into an empty string"""
+        for name in ("HEADER", "BLUE", "CYAN", "GREEN", "YELLOW", "RED", "ENDC", "BOLD", "UNDERLINE"):
+            setattr(cls, name, '')
+
+MENU_ITEMS = [
+    "Add a word",
+    "Add a phrase",
+    "Add an idiom",
+    "Add an example",
+    "Add a grammar rule",
+    "Search",
+    "Bulk import",
+    "Export data",
+    "Exit"
+]
+
+def build_menu_text():
+    """Build the interactive menu and choice prompt with the current color codes"""
+    lines = [f"\n{Colors.BOLD}Available commands:{Colors.ENDC}"]
+    lines.extend(f"  {Colors.CYAN}{number}{Colors.ENDC} - {item}" for number, item in enumerate(MENU_ITEMS, 1))
+    return "\n".join(lines) + "\n", f"\n{Colors.BOLD}Enter your choice (1-9):{Colors.ENDC} "
+
+def set_color(enabled):
+    """Enable or disable colored output, rebuilding the precomputed menu"""
+    global MENU_TEXT, PROMPT_TEXT
+    if not enabled:
+        Colors.disable()
+    MENU_TEXT, PROMPT_TEXT = build_menu_text()
+
+# Escape codes only make sense on a terminal
+set_color(sys.stdout.isatty())
+
+def normalize_key(text):
+    """Lowercase and strip a Hinglish key, interned so repeated keys share one string"""
+    return sys.intern(text.strip().lower())
 
 class TrainingModule:
     def __init__(self):
@@ -47,10 +105,24 @@ class TrainingModule:
             "grammar": self.load_json(GRAMMAR_RULES_PATH, {}),
             "idioms": self.load_json(IDIOMS_PATH, {}),
             "corrections": self.load_json(CORRECTIONS_PATH, {"words": {}, "phrases": {}}),
-            "training_log": self.load_json(TRAINING_LOG_PATH, {"sessions": []}),
-            "dataset": self.load_json(DATASET_PATH, [])
+            # (hinglish, kumaoni) tuples, only loaded once an example is added or the data is exported
+            "dataset": None
         }
         
+        # Apply words/phrases learned (here or by the chatbot) since the last compaction
+        self.learned_log = LearnedLog()
+        self.learned_log.replay(self.data)
+        
+        # (hinglish, kumaoni) pairs already in the dataset, for duplicate checks, built on first use
+        self._dataset_index = None
+        
+        # Lowercased vocab/phrase/idiom entries for search, built on the first search
+        self._search_index = None
+        
+        # Data entries changed since the last flush; with autoflush off they are saved together
+        self._dirty = set()
+        self.autoflush = True
+        
         # Initialize training session
         self.session_id = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
         self.session_log = {
@@ -65,33 +137,99 @@ class TrainingModule:
         print(f"Training module initialized successfully!")
     
     def load_json(self, file_path, default_value):
-        """Load JSON data from file, or return default if file doesn't exist"""
-        try:
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            else:
-                # Create the file with default value
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(default_value, f, ensure_ascii=False, indent=2)
-                return default_value
-        except Exception as e:
-            print(f"Error loading {file_path}: {e}")
-            return default_value
+        """Load JSON data from file, or create it with the default value if it doesn't exist"""
+        return load_json(file_path, default_value, create=True)
     
     def save_json(self, file_path, data):
         """Save JSON data to file"""
+        return save_json(file_path, data)
+    
+    def mark_dirty(self, key):
+        """Record that a data entry changed, saving it right away if autoflush is on"""
+        self._dirty.add(key)
+        if self.autoflush:
+            self.flush()
+    
+    def flush(self):
+        """Save every data entry changed since the last flush"""
+        if self.learned_log.writes and self._dirty & {"vocab", "phrases"}:
+            # vocab/phrases are rewritten anyway, so fold the learned log in with them
+            self.compact_learned_log()
+        
+        for key, file_path in DATA_PATHS.items():
+            if key in self._dirty:
+                self.save_json(file_path, self.dataset_records() if key == "dataset" else self.data[key])
+        self._dirty.clear()
+    
+    def save_learned(self, entry_type, hinglish, kumaoni):
+        """Save a word/phrase change: one line appended to the learned log, or the
+        whole file at the next flush when autoflush is off"""
+        if not self.autoflush:
+            self._dirty.add("vocab" if entry_type == "word" else "phrases")
+            return
+        
+        if self.learned_log.append(entry_type, hinglish, kumaoni):
+            self.compact_learned_log()
+    
+    def compact_learned_log(self):
+        """Write vocab and phrases back to their JSON files and truncate the learned log"""
+        if self.learned_log.writes == 0:
+            return
+        
+        self._dirty.difference_update(("vocab", "phrases"))
+        self.learned_log.compact(self.data, self.save_json)
+    
+    def dataset(self):
+        """Return the dataset as a list of (hinglish, kumaoni) tuples, loading it on first use"""
+        if self.data["dataset"] is None:
+            # Tuples take a fraction of the memory of one dict per example
+            self.data["dataset"] = [(item.get("hinglish"), item.get("kumaoni")) for item in self.load_json(DATASET_PATH, [])]
+        return self.data["dataset"]
+    
+    def dataset_records(self):
+        """Return the dataset in its JSON shape, a list of {"hinglish", "kumaoni"} dicts"""
+        return [{"hinglish": hinglish, "kumaoni": kumaoni} for hinglish, kumaoni in self.dataset()]
+    
+    def stream_dataset(self):
+        """Yield the dataset items one at a time with ijson, without loading the whole list"""
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            return True
+            with open(DATASET_PATH, 'rb') as f:
+                yield from ijson.items(f, "item")
+        except FileNotFoundError:
+            return
         except Exception as e:
-            print(f"Error saving {file_path}: {e}")
-            return False
+            print(f"Error loading {DATASET_PATH}: {e}")
+    
+    def dataset_index(self):
+        """Return the set of (hinglish, kumaoni) pairs in the dataset"""
+        if self._dataset_index is None:
+            if self.data["dataset"] is None and ijson is not None:
+                # Only the pairs are kept, so the dataset list stays unloaded until an example is added
+                self._dataset_index = {(item.get("hinglish"), item.get("kumaoni")) for item in self.stream_dataset()}
+            else:
+                self._dataset_index = set(self.dataset())
+        return self._dataset_index
     
-    def add_word(self, hinglish, kumaoni):
+    def search_index(self):
+        """Return the lowercased (key, value) of every vocab, phrase and idiom entry, keyed by the original key"""
+        if self._search_index is None:
+            self._search_index = {
+                table: {key: (key.lower(), value.lower()) for key, value in self.data[table].items()}
+                for table in ("vocab", "phrases", "idioms")
+            }
+        return self._search_index
+    
+    def update_search_index(self, table, key, value):
+        """Keep the search index in step with a vocab, phrase or idiom change"""
+        if self._search_index is not None:
+            self._search_index[table][key] = (key.lower(), value.lower())
+    
+    def add_word(self, hinglish, kumaoni, timestamp=None):
         """Add a new word to the vocabulary"""
-        hinglish = hinglish.lower().strip()
+        if timestamp is None:
+            timestamp = datetime.datetime.now().isoformat()
+        corrections_changed = False
+        hinglish = normalize_key(hinglish)
         kumaoni = kumaoni.strip()
         
         # Check if word already exists
@@ -102,41 +240,46 @@ class TrainingModule:
                 return False
             else:
                 # Add to corrections
+                corrections_changed = True
                 if hinglish not in self.data["corrections"]["words"]:
                     self.data["corrections"]["words"][hinglish] = []
                 
                 self.data["corrections"]["words"][hinglish].append({
                     "old": existing,
                     "new": kumaoni,
-                    "timestamp": datetime.datetime.now().isoformat()
+                    "timestamp": timestamp
                 })
                 
                 print(f"Updated word '{hinglish}' from '{existing}' to '{kumaoni}'")
         
         # Add to vocabulary
         self.data["vocab"][hinglish] = kumaoni
+        self.update_search_index("vocab", hinglish, kumaoni)
         
         # Save vocabulary
-        self.save_json(VOCAB_MAP_PATH, self.data["vocab"])
+        self.save_learned("word", hinglish, kumaoni)
         
-        # Save corrections if needed
-        if "corrections" in self.data and self.data["corrections"]["words"]:
-            self.save_json(CORRECTIONS_PATH, self.data["corrections"])
+        # Save corrections if this call added one
+        if corrections_changed:
+            self.mark_dirty("corrections")
         
         # Log the addition
         self.session_log["entries"].append({
             "type": "word",
             "hinglish": hinglish,
             "kumaoni": kumaoni,
-            "timestamp": datetime.datetime.now().isoformat()
+            "timestamp": timestamp
         })
         
         print(f"Added word: {hinglish} → {kumaoni}")
         return True
     
-    def add_phrase(self, hinglish, kumaoni):
+    def add_phrase(self, hinglish, kumaoni, timestamp=None):
         """Add a new phrase to the phrases mapping"""
-        hinglish = hinglish.lower().strip()
+        if timestamp is None:
+            timestamp = datetime.datetime.now().isoformat()
+        corrections_changed = False
+        hinglish = normalize_key(hinglish)
         kumaoni = kumaoni.strip()
         
         # Check if phrase already exists
@@ -147,94 +290,101 @@ class TrainingModule:
                 return False
             else:
                 # Add to corrections
+                corrections_changed = True
                 if hinglish not in self.data["corrections"]["phrases"]:
                     self.data["corrections"]["phrases"][hinglish] = []
                 
                 self.data["corrections"]["phrases"][hinglish].append({
                     "old": existing,
                     "new": kumaoni,
-                    "timestamp": datetime.datetime.now().isoformat()
+                    "timestamp": timestamp
                 })
                 
                 print(f"Updated phrase '{hinglish}' from '{existing}' to '{kumaoni}'")
         
         # Add to phrases
         self.data["phrases"][hinglish] = kumaoni
+        self.update_search_index("phrases", hinglish, kumaoni)
         
         # Save phrases
-        self.save_json(PHRASES_PATH, self.data["phrases"])
+        self.save_learned("phrase", hinglish, kumaoni)
         
-        # Save corrections if needed
-        if "corrections" in self.data and self.data["corrections"]["phrases"]:
-            self.save_json(CORRECTIONS_PATH, self.data["corrections"])
+        # Save corrections if this call added one
+        if corrections_changed:
+            self.mark_dirty("corrections")
         
         # Log the addition
         self.session_log["entries"].append({
             "type": "phrase",
             "hinglish": hinglish,
             "kumaoni": kumaoni,
-            "timestamp": datetime.datetime.now().isoformat()
+            "timestamp": timestamp
         })
         
         print(f"Added phrase: {hinglish} → {kumaoni}")
         return True
     
-    def add_idiom(self, kumaoni, meaning):
+    def add_idiom(self, kumaoni, meaning, timestamp=None):
         """Add a new idiom"""
+        if timestamp is None:
+            timestamp = datetime.datetime.now().isoformat()
         kumaoni = kumaoni.strip()
         meaning = meaning.strip()
         
         # Add to idioms
         self.data["idioms"][kumaoni] = meaning
+        self.update_search_index("idioms", kumaoni, meaning)
         
         # Save idioms
-        self.save_json(IDIOMS_PATH, self.data["idioms"])
+        self.mark_dirty("idioms")
         
         # Log the addition
         self.session_log["entries"].append({
             "type": "idiom",
             "kumaoni": kumaoni,
             "meaning": meaning,
-            "timestamp": datetime.datetime.now().isoformat()
+            "timestamp": timestamp
         })
         
         print(f"Added idiom: {kumaoni} (meaning: {meaning})")
         return True
     
-    def add_example(self, hinglish, kumaoni):
+    def add_example(self, hinglish, kumaoni, timestamp=None):
         """Add a new example to the dataset"""
+        if timestamp is None:
+            timestamp = datetime.datetime.now().isoformat()
         hinglish = hinglish.strip()
         kumaoni = kumaoni.strip()
         
         # Check if example already exists
-        for item in self.data["dataset"]:
-            if item["hinglish"] == hinglish and item["kumaoni"] == kumaoni:
-                print(f"Example already exists in the dataset")
-                return False
+        key = (hinglish, kumaoni)
+        if key in self.dataset_index():
+            print(f"Example already exists in the dataset")
+            return False
         
         # Add to dataset
-        self.data["dataset"].append({
-            "hinglish": hinglish,
-            "kumaoni": kumaoni
-        })
+        self.dataset().append(key)
+        self._dataset_index.add(key)
         
         # Save dataset
-        self.save_json(DATASET_PATH, self.data["dataset"])
+        self.mark_dirty("dataset")
         
         # Log the addition
         self.session_log["entries"].append({
             "type": "example",
             "hinglish": hinglish,
             "kumaoni": kumaoni,
-            "timestamp": datetime.datetime.now().isoformat()
+            "timestamp": timestamp
         })
         
         print(f"Added example to dataset")
         return True
     
-    def add_grammar_rule(self, category, hinglish, kumaoni):
+    def add_grammar_rule(self, category, hinglish, kumaoni, timestamp=None):
         """Add a new grammar rule"""
-        hinglish = hinglish.lower().strip()
+        if timestamp is None:
+            timestamp = datetime.datetime.now().isoformat()
+        hinglish = normalize_key(hinglish)
         kumaoni = kumaoni.strip()
         
         # Ensure category exists
@@ -245,7 +395,7 @@ class TrainingModule:
         self.data["grammar"][category][hinglish] = kumaoni
         
         # Save grammar rules
-        self.save_json(GRAMMAR_RULES_PATH, self.data["grammar"])
+        self.mark_dirty("grammar")
         
         # Log the addition
         self.session_log["entries"].append({
@@ -253,47 +403,123 @@ class TrainingModule:
             "category": category,
             "hinglish": hinglish,
             "kumaoni": kumaoni,
-            "timestamp": datetime.datetime.now().isoformat()
+            "timestamp": timestamp
         })
         
         print(f"Added grammar rule: {category} - {hinglish} → {kumaoni}")
         return True
     
     def save_training_log(self):
-        """Save the training log"""
+        """Append this session to the training log"""
         if self.session_log["entries"]:
-            self.data["training_log"]["sessions"].append(self.session_log)
-            self.save_json(TRAINING_LOG_PATH, self.data["training_log"])
+            try:
+                # One line per session, so earlier sessions are never rewritten
+                with open(TRAINING_LOG_JSONL_PATH, 'ab') as f:
+                    f.write(dumps_json(self.session_log, indent=False) + b"\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            except Exception as e:
+                print(f"Error saving {TRAINING_LOG_JSONL_PATH}: {e}")
+                return
             print(f"Saved training log with {len(self.session_log['entries'])} entries")
     
-    def bulk_import(self, file_path):
-        """Import data in bulk from a JSON file"""
+    def load_training_log(self):
+        """Yield every logged training session, oldest first"""
+        yield from load_json(TRAINING_LOG_PATH, {"sessions": []})["sessions"]
+        
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                import_data = json.load(f)
+            with open(TRAINING_LOG_JSONL_PATH, 'rb') as f:
+                for line in f:
+                    try:
+                        yield loads_json(line)
+                    except ValueError:
+                        continue  # torn last line from an interrupted write
+        except FileNotFoundError:
+            return
+    
+    def merge_learned(self, entry_type, entries, timestamp):
+        """Merge Hinglish -> Kumaoni words or phrases into the data in one pass, returning how many were added or changed"""
+        table = "vocab" if entry_type == "word" else "phrases"
+        mapping = self.data[table]
+        corrections = self.data["corrections"]["words" if entry_type == "word" else "phrases"]
+        log_entries = self.session_log["entries"]
+        added = 0
+        
+        for hinglish, kumaoni in entries.items():
+            hinglish = normalize_key(hinglish)
+            kumaoni = kumaoni.strip()
             
-            words_added = 0
-            phrases_added = 0
-            examples_added = 0
+            if hinglish in mapping:
+                existing = mapping[hinglish]
+                if existing == kumaoni:
+                    continue
+                
+                # Record the change as a correction
+                corrections.setdefault(hinglish, []).append({
+                    "old": existing,
+                    "new": kumaoni,
+                    "timestamp": timestamp
+                })
+                self._dirty.add("corrections")
+                print(f"Updated {entry_type} '{hinglish}' from '{existing}' to '{kumaoni}'")
             
-            # Import words
-            if "words" in import_data:
-                for hinglish, kumaoni in import_data["words"].items():
-                    if self.add_word(hinglish, kumaoni):
-                        words_added += 1
+            mapping[hinglish] = kumaoni
+            self.update_search_index(table, hinglish, kumaoni)
+            log_entries.append({
+                "type": entry_type,
+                "hinglish": hinglish,
+                "kumaoni": kumaoni,
+                "timestamp": timestamp
+            })
+            added += 1
+        
+        if added:
+            self._dirty.add(table)
+        return added
+    
+    def merge_examples(self, examples, timestamp):
+        """Append the examples not already in the dataset, returning how many were added"""
+        index = self.dataset_index()
+        log_entries = self.session_log["entries"]
+        new_items = []
+        
+        for example in examples:
+            if "hinglish" not in example or "kumaoni" not in example:
+                continue
             
-            # Import phrases
-            if "phrases" in import_data:
-                for hinglish, kumaoni in import_data["phrases"].items():
-                    if self.add_phrase(hinglish, kumaoni):
-                        phrases_added += 1
+            hinglish = example["hinglish"].strip()
+            kumaoni = example["kumaoni"].strip()
+            key = (hinglish, kumaoni)
+            if key in index:
+                continue
             
-            # Import examples
-            if "examples" in import_data:
-                for example in import_data["examples"]:
-                    if "hinglish" in example and "kumaoni" in example:
-                        if self.add_example(example["hinglish"], example["kumaoni"]):
-                            examples_added += 1
+            index.add(key)
+            new_items.append(key)
+            log_entries.append({
+                "type": "example",
+                "hinglish": hinglish,
+                "kumaoni": kumaoni,
+                "timestamp": timestamp
+            })
+        
+        if new_items:
+            self.dataset().extend(new_items)
+            self._dirty.add("dataset")
+        return len(new_items)
+    
+    def bulk_import(self, file_path):
+        """Import data in bulk from a JSON file"""
+        try:
+            with open(file_path, 'rb') as f:
+                import_data = loads_json(f.read())
+            
+            # Every entry of this import shares one timestamp
+            timestamp = datetime.datetime.now().isoformat()
+            
+            # Merge everything in memory; each changed file is saved once at the end
+            words_added = self.merge_learned("word", import_data.get("words", {}), timestamp)
+            phrases_added = self.merge_learned("phrase", import_data.get("phrases", {}), timestamp)
+            examples_added = self.merge_examples(import_data.get("examples", []), timestamp)
             
             print(f"Bulk import completed: {words_added} words, {phrases_added} phrases, {examples_added} examples")
             return True
@@ -301,6 +527,9 @@ class TrainingModule:
         except Exception as e:
             print(f"Error during bulk import: {e}")
             return False
+        
+        finally:
+            self.flush()
     
     def export_data(self, file_path):
         """Export all data to a JSON file"""
@@ -310,11 +539,13 @@ class TrainingModule:
                 "phrases": self.data["phrases"],
                 "grammar": self.data["grammar"],
                 "idioms": self.data["idioms"],
-                "dataset": self.data["dataset"]
+                "dataset": self.dataset_records(),
+                # Every logged training session, so the export is a complete backup
+                "training_log": {"sessions": list(self.load_training_log())}
             }
             
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(export_data, f, ensure_ascii=False, indent=2)
+            with open(file_path, 'wb') as f:
+                f.write(dumps_json(export_data))
             
             print(f"Data exported to {file_path}")
             return True
@@ -332,28 +563,30 @@ class TrainingModule:
             "idioms": []
         }
         
+        index = self.search_index()
+        
         # Search in vocabulary
-        for hinglish, kumaoni in self.data["vocab"].items():
-            if query in hinglish.lower() or query in kumaoni.lower():
+        for hinglish, (hinglish_lower, kumaoni_lower) in index["vocab"].items():
+            if query in hinglish_lower or query in kumaoni_lower:
                 results["words"].append({
                     "hinglish": hinglish,
-                    "kumaoni": kumaoni
+                    "kumaoni": self.data["vocab"][hinglish]
                 })
         
         # Search in phrases
-        for hinglish, kumaoni in self.data["phrases"].items():
-            if query in hinglish.lower() or query in kumaoni.lower():
+        for hinglish, (hinglish_lower, kumaoni_lower) in index["phrases"].items():
+            if query in hinglish_lower or query in kumaoni_lower:
                 results["phrases"].append({
                     "hinglish": hinglish,
-                    "kumaoni": kumaoni
+                    "kumaoni": self.data["phrases"][hinglish]
                 })
         
         # Search in idioms
-        for kumaoni, meaning in self.data["idioms"].items():
-            if query in kumaoni.lower() or query in meaning.lower():
+        for kumaoni, (kumaoni_lower, meaning_lower) in index["idioms"].items():
+            if query in kumaoni_lower or query in meaning_lower:
                 results["idioms"].append({
                     "kumaoni": kumaoni,
-                    "meaning": meaning
+                    "meaning": self.data["idioms"][kumaoni]
                 })
         
         return results
@@ -365,18 +598,9 @@ class TrainingModule:
         print("Type 'exit' at any prompt to return to the main menu.")
         
         while True:
-            print(f"\n{Colors.BOLD}Available commands:{Colors.ENDC}")
-            print(f"  {Colors.CYAN}1{Colors.ENDC} - Add a word")
-            print(f"  {Colors.CYAN}2{Colors.ENDC} - Add a phrase")
-            print(f"  {Colors.CYAN}3{Colors.ENDC} - Add an idiom")
-            print(f"  {Colors.CYAN}4{Colors.ENDC} - Add an example")
-            print(f"  {Colors.CYAN}5{Colors.ENDC} - Add a grammar rule")
-            print(f"  {Colors.CYAN}6{Colors.ENDC} - Search")
-            print(f"  {Colors.CYAN}7{Colors.ENDC} - Bulk import")
-            print(f"  {Colors.CYAN}8{Colors.ENDC} - Export data")
-            print(f"  {Colors.CYAN}9{Colors.ENDC} - Exit")
-            
-            choice = input(f"\n{Colors.BOLD}Enter your choice (1-9):{Colors.ENDC} ")
+            # The whole menu goes out in one write (input flushes it before prompting)
+            sys.stdout.write(MENU_TEXT)
+            choice = input(PROMPT_TEXT)
             
             if choice == "9" or choice.lower() == "exit":
                 break
@@ -495,7 +719,9 @@ class TrainingModule:
             else:
                 print(f"{Colors.RED}Invalid choice. Please enter a number from 1 to 9.{Colors.ENDC}")
         
-        # Save training log before exiting
+        # Save pending changes, fold the learned log into the JSON files and save the training log before exiting
+        self.flush()
+        self.compact_learned_log()
         self.save_training_log()
         print("Training session completed!")
 
@@ -507,6 +733,9 @@ def main():
     
     args = parser.parse_args()
     
+    if args.no_color:
+        set_color(False)
+    
     # Initialize training module
     training = TrainingModule()
     
@@ -5,8 +5,17 @@ Test script to verify that the training and inference are working correctly.
 
 import os
 import sys
-import torch
-from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+from functools import lru_cache
+from translation_cache import TranslationCache, model_fingerprint
+
+@lru_cache(maxsize=1)
+def get_model():
+    """Load the inference model and tokenizer once for every test that needs them"""
+    sys.path.append(os.path.abspath("inference"))
+    from generate import get_translator
+
+    # generate.load_model loads in half precision with SDPA attention
+    return get_translator()
 
 def test_model_loading():
     """Test loading the model and tokenizer"""
@@ -19,17 +28,9 @@ def test_model_loading():
         return False
 
     try:
-        # Load tokenizer
-        print("Loading tokenizer...")
-        tokenizer = AutoTokenizer.from_pretrained(model_dir, local_files_only=True)
-
-        # Load model
-        print("Loading model...")
-        model = AutoModelForSeq2SeqLM.from_pretrained(
-            model_dir,
-            device_map="auto",
-            local_files_only=True
-        )
+        # Load model and tokenizer (shared with the inference test)
+        print("Loading model and tokenizer...")
+        get_model()
 
         print("Model and tokenizer loaded successfully!")
         return True
@@ -44,11 +45,7 @@ def test_inference():
     # Import the inference module
     sys.path.append(os.path.abspath("inference"))
     try:
-        from generate import load_model, translate
-
-        # Load model and tokenizer
-        print("Loading model for inference...")
-        model, tokenizer = load_model()
+        from generate import CT2_DIR, MODEL_DIR, OUTPUT_DIR, decoding_params, translate_batch
 
         # Test translation
         test_texts = [
@@ -57,9 +54,14 @@ def test_inference():
             "Thank you"
         ]
 
+        # Reuse the model loaded by test_model_loading, and earlier outputs where cached
+        # (keyed on the decoding settings get_model's default load_model call uses)
+        params = {"script": "test_inference", **decoding_params()}
+        cache = TranslationCache(model_fingerprint(MODEL_DIR, OUTPUT_DIR, CT2_DIR), params)
+        translations = cache.translate_batch(test_texts, lambda texts: translate_batch(texts, *get_model()))
+
         print("\nTranslation examples:")
-        for text in test_texts:
-            translation = translate(text, model, tokenizer)
+        for text, translation in zip(test_texts, translations):
             print(f"Hinglish: {text}")
             print(f"Kumaoni: {translation}")
             print("-" * 40)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Test script for Kumaoni translator using Gemma model.
+Translates dataset and custom examples with a single model load and one
+batched generation over the deduplicated prompts.
+"""
+
+import os
+import json
+import argparse
+from translate_gemma import MODEL_DIR, OUTPUT_DIR, decoding_params, load_model, translate_batch
+from translation_cache import TranslationCache, model_fingerprint
+
+CUSTOM_EXAMPLES = [
+    "aap kaise hain",
+    "mera naam John hai",
+    "main Kumaon se hoon",
+    "yeh bahut sundar jagah hai",
+    "mujhe kumaoni bhasha seekhni hai"
+]
+
+def main(num_examples=10, custom_examples=CUSTOM_EXAMPLES):
+    """Translate the first num_examples dataset entries plus the custom examples"""
+    # Load some examples from the dataset
+    dataset_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/data.json")
+    with open(dataset_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    
+    # Select a few examples for testing
+    test_examples = data[:num_examples]
+    
+    # Translate every distinct prompt in one batch (load_model is cached, and
+    # only called if some prompt is not in the translation cache)
+    prompts = list(dict.fromkeys([item["hinglish"] for item in test_examples] + list(custom_examples)))
+    params = {"script": "test_gemma", **decoding_params()}
+    cache = TranslationCache(model_fingerprint(MODEL_DIR, OUTPUT_DIR), params)
+    translations = dict(zip(prompts, cache.translate_batch(
+        prompts, lambda texts: translate_batch(texts, *load_model(), batch_size=len(texts))
+    )))
+    
+    print("\nTranslation examples:")
+    for item in test_examples:
+        hinglish = item["hinglish"]
+        expected = item["kumaoni"]
+        
+        print(f"Hinglish: {hinglish}")
+        print(f"Expected: {expected}")
+        print(f"Generated: {translations[hinglish]}")
+        print("-" * 40)
+    
+    if custom_examples:
+        print("\nCustom examples:")
+        for text in custom_examples:
+            print(f"Hinglish: {text}")
+            print(f"Kumaoni: {translations[text]}")
+            print("-" * 40)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test the Gemma Hinglish to Kumaoni translator")
+    parser.add_argument("--num_examples", type=int, default=10, help="Number of dataset examples to translate")
+    parser.add_argument("--no_custom", action="store_true", help="Skip the custom examples")
+    args = parser.parse_args()
+    
+    main(args.num_examples, [] if args.no_custom else CUSTOM_EXAMPLES)
@@ -4,16 +4,31 @@ Test script to verify the translation functionality.
 """
 
 import os
+import sys
+import argparse
+from functools import lru_cache
 import torch
-from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+from transformers import AutoModelForSeq2SeqLM, AutoTokenizer, BitsAndBytesConfig
 from peft import PeftModel
+from translation_cache import TranslationCache, model_fingerprint
+
+# Use the same NLLB language pair, decoding settings and compile rules as inference/generate.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "inference"))
+from generate import SRC_LANG, decoding_params as inference_decoding_params, generate_batch, should_compile, warmup
 
 # Paths
 MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models/facebook")
 OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nllb-kumaoni")
 
-def load_model():
-    """Load the model and tokenizer"""
+# Half precision on GPU (bf16 where supported), full precision on CPU
+if torch.cuda.is_available():
+    TORCH_DTYPE = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+else:
+    TORCH_DTYPE = torch.float32
+
+@lru_cache(maxsize=1)
+def load_model(load_in_8bit=False, compile_model=True):
+    """Load the model and tokenizer (cached, so every caller shares one copy)"""
     print(f"Loading model from {OUTPUT_DIR}...")
     
     # Check if fine-tuned model exists
@@ -25,22 +40,26 @@ def load_model():
     
     # Load tokenizer
     tokenizer = AutoTokenizer.from_pretrained(MODEL_DIR, local_files_only=True)
+    tokenizer.src_lang = SRC_LANG
+    
+    # Half precision weights with fused attention kernels (8-bit weights on request)
+    model_kwargs = {
+        "device_map": "auto",
+        "torch_dtype": TORCH_DTYPE,
+        "attn_implementation": "sdpa",
+        "low_cpu_mem_usage": True,
+        "local_files_only": True,
+    }
+    if load_in_8bit:
+        model_kwargs["quantization_config"] = BitsAndBytesConfig(load_in_8bit=True)
     
     # Load model
     if model_path == MODEL_DIR:
         # Load base model directly
-        model = AutoModelForSeq2SeqLM.from_pretrained(
-            model_path,
-            device_map="auto",
-            local_files_only=True
-        )
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_path, **model_kwargs)
     else:
         # Load base model first
-        base_model = AutoModelForSeq2SeqLM.from_pretrained(
-            MODEL_DIR,
-            device_map="auto",
-            local_files_only=True
-        )
+        base_model = AutoModelForSeq2SeqLM.from_pretrained(MODEL_DIR, **model_kwargs)
         
         # Load the fine-tuned model
         try:
@@ -50,40 +69,51 @@ def load_model():
             print(f"Error loading fine-tuned model: {e}")
             print("Falling back to base model")
             model = base_model
+        else:
+            # Fold the adapters into the base weights, leaving a plain model whose
+            # forward is the one generate() calls (and the one compiled below)
+            try:
+                model = model.merge_and_unload()
+                print("Merged LoRA adapters into base weights")
+            except Exception as e:
+                print(f"Could not merge LoRA adapters, using unmerged model: {e}")
+    
+    model.eval()
+    
+    # Compile the forward pass on GPU to cut per-step launch overhead while decoding
+    # (generate() calls model.forward each step, so compiling the module would be bypassed)
+    if should_compile(compile_model, MODEL_DIR):
+        print("Compiling model with torch.compile...")
+        model.forward = torch.compile(model.forward, mode="reduce-overhead", fullgraph=False, dynamic=False)
+        
+        # Compile every batch and input shape up front instead of during the examples
+        warmup(model, tokenizer)
     
     return model, tokenizer
 
-def translate(text, model, tokenizer, max_length=100):
+def translate(text, model, tokenizer, max_length=100, num_beams=1):
     """Translate Hinglish text to Kumaoni"""
-    # Format the input prompt
-    prompt = f"translate Hinglish to Kumaoni: {text}"
-    
-    # Tokenize the input
-    inputs = tokenizer(prompt, return_tensors="pt", max_length=64, truncation=True, padding="max_length")
-    inputs = {k: v.to(model.device) for k, v in inputs.items()}
-    
-    # Generate the translation
-    with torch.no_grad():
-        outputs = model.generate(
-            **inputs,
-            max_new_tokens=max_length,
-            num_beams=5,
-            temperature=0.7,
-            top_p=0.9,
-            do_sample=True,
-            pad_token_id=tokenizer.pad_token_id,
-            eos_token_id=tokenizer.eos_token_id
-        )
-    
-    # Decode the generated text
-    translation = tokenizer.decode(outputs[0], skip_special_tokens=True)
-    
-    return translation
+    return translate_batch([text], model, tokenizer, max_length, num_beams)[0]
+
+def translate_batch(texts, model, tokenizer, max_length=100, num_beams=1):
+    """Translate a list of Hinglish texts to Kumaoni with one generate call"""
+    # Greedy by default, or plain beam search when num_beams > 1 - no sampling,
+    # so repeated test runs print the same translations
+    return generate_batch(texts, model, tokenizer, max_length, num_beams=num_beams)
+
+def decoding_params(num_beams=1, load_in_8bit=False, compile_model=True, max_length=100):
+    """Settings that determine translate_batch's output for the given options, computed without loading the model"""
+    params = inference_decoding_params(max_length, compile_model, "int8" if load_in_8bit else "none",
+                                       ct2_dir=None, base_model_path=MODEL_DIR)
+    params["num_beams"] = num_beams
+    return params
 
 def main():
     """Test the translation functionality"""
-    # Load model and tokenizer
-    model, tokenizer = load_model()
+    parser = argparse.ArgumentParser(description="Test Hinglish to Kumaoni translation")
+    parser.add_argument("--num_beams", type=int, default=1, help="Beam width (1 for greedy decoding)")
+    parser.add_argument("--load_in_8bit", action="store_true", help="Load 8-bit weights with bitsandbytes")
+    args = parser.parse_args()
     
     # Test examples from the dataset
     test_examples = [
@@ -94,9 +124,18 @@ def main():
         "aap kahan ja rahe hain"
     ]
     
+    # Reuse earlier outputs; the model is only loaded if some example is not cached
+    # (the compiled graphs are warmed up for greedy decoding, so beam search runs uncompiled)
+    compile_model = args.num_beams == 1
+    params = {"script": "test_translation", **decoding_params(args.num_beams, args.load_in_8bit, compile_model)}
+    cache = TranslationCache(model_fingerprint(MODEL_DIR, OUTPUT_DIR), params)
+    translations = cache.translate_batch(
+        test_examples,
+        lambda texts: translate_batch(texts, *load_model(args.load_in_8bit, compile_model), num_beams=args.num_beams)
+    )
+    
     print("\nTranslation examples:")
-    for text in test_examples:
-        translation = translate(text, model, tokenizer)
+    for text, translation in zip(test_examples, translations):
         print(f"Hinglish: {text}")
         print(f"Kumaoni: {translation}")
         print("-" * 40)
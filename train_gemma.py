@@ -12,32 +12,99 @@ from transformers import (
     AutoTokenizer,
     TrainingArguments,
     Trainer,
-    DataCollatorForLanguageModeling
+    DataCollatorForLanguageModeling,
+    BitsAndBytesConfig
 )
 from peft import LoraConfig, get_peft_model, prepare_model_for_kbit_training
-from datasets import Dataset
+from datasets import Dataset, load_from_disk
+
+# orjson is optional - it parses the dataset several times faster than json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# flash-attn is optional - only needed for Flash-Attention 2 training
+try:
+    import flash_attn
+except ImportError:
+    flash_attn = None
 
 # Paths
 MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models/gemma")
 DATASET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/data.json")
 OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gemma-kumaoni")
 
+# Worker processes for dataset formatting and tokenization
+NUM_PROC = min(8, os.cpu_count() or 1)
+
+# Tokenized dataset saved by the last run, reused while its key matches
+TOKENIZED_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/.cache/gemma_tokenized")
+TOKENIZED_CACHE_VERSION = 2  # bump when the prompt format or tokenization changes
+
+# QLoRA compute dtype: bf16 on Ampere+ GPUs, fp16 elsewhere
+USE_BF16 = torch.cuda.is_available() and torch.cuda.is_bf16_supported()
+COMPUTE_DTYPE = torch.bfloat16 if USE_BF16 else torch.float16
+
+# Flash-Attention 2 needs an Ampere+ GPU and half precision weights; SDPA otherwise
+if flash_attn is not None and torch.cuda.is_available() and torch.cuda.get_device_capability()[0] >= 8:
+    ATTN_IMPLEMENTATION = "flash_attention_2"
+else:
+    ATTN_IMPLEMENTATION = "sdpa"
+
+# 4-bit NF4 quantization (with double quantization) for QLoRA training
+bnb_config = BitsAndBytesConfig(
+    load_in_4bit=True,
+    bnb_4bit_quant_type="nf4",
+    bnb_4bit_use_double_quant=True,
+    bnb_4bit_compute_dtype=COMPUTE_DTYPE,
+)
+
 def load_dataset(dataset_path):
     """Load the dataset from a JSON file"""
-    with open(dataset_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    # Convert to the format expected by the Dataset class
-    formatted_data = {
-        "text": []
+    with open(dataset_path, 'rb') as f:
+        raw = f.read()
+    data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+    # Format each batch of pairs as instructions with input and output
+    def format_fn(batch):
+        return {
+            "text": [
+                f"Translate from Hinglish to Kumaoni:\nHinglish: {hinglish}\nKumaoni: {kumaoni}"
+                for hinglish, kumaoni in zip(batch["hinglish"], batch["kumaoni"])
+            ]
+        }
+
+    dataset = Dataset.from_list(data)
+    return dataset.map(format_fn, batched=True, batch_size=1000, num_proc=NUM_PROC,
+                       remove_columns=dataset.column_names)
+
+def tokenized_cache_key():
+    """What the tokenized dataset is built from: the dataset file and the tokenizer"""
+    return {
+        "version": TOKENIZED_CACHE_VERSION,
+        "dataset": os.stat(DATASET_PATH).st_mtime_ns,
+        "tokenizer": MODEL_DIR,
     }
 
-    for item in data:
-        # Format as instruction with input and output
-        formatted_text = f"Translate from Hinglish to Kumaoni:\nHinglish: {item['hinglish']}\nKumaoni: {item['kumaoni']}"
-        formatted_data["text"].append(formatted_text)
-
-    return Dataset.from_dict(formatted_data)
+def load_tokenized_cache():
+    """Load the tokenized dataset saved by an earlier run, or None if it is missing or stale"""
+    try:
+        with open(os.path.join(TOKENIZED_CACHE_DIR, "cache_key.json"), 'r', encoding='utf-8') as f:
+            if json.load(f) != tokenized_cache_key():
+                return None
+        return load_from_disk(TOKENIZED_CACHE_DIR)
+    except Exception:
+        return None
+
+def save_tokenized_cache(tokenized_dataset):
+    """Save the tokenized dataset and its key for the next run"""
+    try:
+        tokenized_dataset.save_to_disk(TOKENIZED_CACHE_DIR)
+        with open(os.path.join(TOKENIZED_CACHE_DIR, "cache_key.json"), 'w', encoding='utf-8') as f:
+            json.dump(tokenized_cache_key(), f)
+    except Exception as e:
+        print(f"Error saving {TOKENIZED_CACHE_DIR}: {e}")
 
 def main():
     # Load tokenizer
@@ -48,16 +115,19 @@ def main():
     if tokenizer.pad_token is None:
         tokenizer.pad_token = tokenizer.eos_token
 
-    # Load model with 8-bit quantization to save memory
+    # Load model with 4-bit NF4 quantization to save memory
     print(f"Loading model from {MODEL_DIR}...")
     model = AutoModelForCausalLM.from_pretrained(
         MODEL_DIR,
         device_map="auto",
-        load_in_8bit=True,  # Use 8-bit quantization
+        quantization_config=bnb_config,
+        torch_dtype=COMPUTE_DTYPE,
+        attn_implementation=ATTN_IMPLEMENTATION,
+        low_cpu_mem_usage=True,
         local_files_only=True
     )
 
-    # Prepare model for 8-bit training
+    # Prepare model for 4-bit training
     model = prepare_model_for_kbit_training(model)
 
     # Configure LoRA for efficient fine-tuning
@@ -67,53 +137,77 @@ def main():
         lora_dropout=0.05,  # Dropout probability for LoRA layers
         bias="none",
         task_type="CAUSAL_LM",
-        target_modules=["q_proj", "k_proj", "v_proj", "o_proj"]  # Attention modules to fine-tune
+        # Attention and MLP projections, so the adapters cover every linear layer
+        target_modules=["q_proj", "k_proj", "v_proj", "o_proj", "gate_proj", "up_proj", "down_proj"]
     )
 
     # Apply LoRA to the model
     model = get_peft_model(model, peft_config)
     model.print_trainable_parameters()
 
-    # Load and preprocess the dataset
-    print(f"Loading dataset from {DATASET_PATH}...")
-    dataset = load_dataset(DATASET_PATH)
+    # Recompute activations in the backward pass instead of storing them
+    # (the KV cache is useless during training and conflicts with checkpointing)
+    model.gradient_checkpointing_enable()
+    model.enable_input_require_grads()
+    model.config.use_cache = False
 
     # Tokenize the dataset
     def tokenize_function(examples):
-        # Tokenize the texts
+        # Tokenize the texts without padding; the collator pads each batch
+        # to its own longest example and builds the labels from input_ids
         result = tokenizer(
             examples["text"],
-            padding="max_length",
             truncation=True,
             max_length=128,
             return_tensors=None  # Return Python lists instead of tensors
         )
 
-        # Create input_ids and attention_mask
-        result["labels"] = result["input_ids"].copy()
+        # Token counts, so the trainer can batch examples of similar length
+        result["length"] = [len(input_ids) for input_ids in result["input_ids"]]
 
         return result
 
-    tokenized_dataset = dataset.map(tokenize_function, batched=True, remove_columns=["text"])
+    # Reuse the tokenized dataset from an earlier run if the data hasn't changed
+    tokenized_dataset = load_tokenized_cache()
+    if tokenized_dataset is not None:
+        print(f"Loaded tokenized dataset from {TOKENIZED_CACHE_DIR}")
+    else:
+        # Load and preprocess the dataset
+        print(f"Loading dataset from {DATASET_PATH}...")
+        dataset = load_dataset(DATASET_PATH)
+
+        tokenized_dataset = dataset.map(tokenize_function, batched=True, batch_size=1000, num_proc=NUM_PROC,
+                                        remove_columns=["text"], load_from_cache_file=True)
+        save_tokenized_cache(tokenized_dataset)
 
     # Data collator
-    data_collator = DataCollatorForLanguageModeling(
+    lm_collator = DataCollatorForLanguageModeling(
         tokenizer=tokenizer,
-        mlm=False  # We're not doing masked language modeling
+        mlm=False,  # We're not doing masked language modeling
+        pad_to_multiple_of=8  # Keep padded lengths tensor-core friendly
     )
 
+    # The length column is only for grouping batches, so keep it away from the model
+    def data_collator(features):
+        return lm_collator([{k: v for k, v in feature.items() if k != "length"} for feature in features])
+
     # Training arguments
     training_args = TrainingArguments(
         output_dir=OUTPUT_DIR,
-        per_device_train_batch_size=2,
-        gradient_accumulation_steps=4,
+        per_device_train_batch_size=8,  # Checkpointing frees room for larger batches
+        gradient_accumulation_steps=1,
+        gradient_checkpointing=True,
+        optim="paged_adamw_8bit",  # 8-bit optimizer state, paged to CPU under memory pressure
         learning_rate=2e-5,
         num_train_epochs=3,
         weight_decay=0.01,
         logging_steps=10,
         save_strategy="epoch",
-        fp16=True,  # Use mixed precision training
+        bf16=USE_BF16,  # Mixed precision in the quantization compute dtype
+        fp16=not USE_BF16,
         remove_unused_columns=False,
+        group_by_length=True,  # Batch similar-length examples to cut padding
+        length_column_name="length",
     )
 
     # Initialize trainer
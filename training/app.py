@@ -1,3 +1,4 @@
+import asyncio
 import torch
 from transformers import (
     AutoModelForSeq2SeqLM,
@@ -5,9 +6,19 @@ from transformers import (
     AutoTokenizer,
     BitsAndBytesConfig
 )
-from langdetect import detect
 import gradio as gr
+import gc
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+# flash-attn is optional
+try:
+    import flash_attn
+except ImportError:
+    flash_attn = None
 
 # Local paths
 NLLB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "nllb-kumaoni")
@@ -15,6 +26,16 @@ GEMMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file
 FACEBOOK_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models/facebook")
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 
+# Gemma uses Flash-Attention 2 where available; NLLB and older GPUs use PyTorch SDPA
+if flash_attn is not None and torch.cuda.is_available() and torch.cuda.get_device_capability()[0] >= 8:
+    GEMMA_ATTN_IMPLEMENTATION = "flash_attention_2"
+else:
+    GEMMA_ATTN_IMPLEMENTATION = "sdpa"
+
+# NLLB language codes used when fine-tuning (Nepali stands in for Kumaoni)
+SRC_LANG = "hin_Deva"
+TGT_LANG = "npi_Deva"
+
 # 4-bit quantization setup
 bnb_config = BitsAndBytesConfig(
     load_in_4bit=True,
@@ -22,107 +43,233 @@ bnb_config = BitsAndBytesConfig(
     bnb_4bit_compute_dtype=torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16,
 )
 
-# Load NLLB model and tokenizer
-try:
-    print(f"Loading NLLB model from {NLLB_PATH}...")
-    nllb_tokenizer = AutoTokenizer.from_pretrained(NLLB_PATH, local_files_only=True)
-    nllb_model = AutoModelForSeq2SeqLM.from_pretrained(
-        NLLB_PATH,
+# Both loaders share one lock, so concurrent first requests don't load a model twice
+model_lock = threading.Lock()
+
+# The compiled Gemma model keeps one static KV cache (and one set of CUDA graphs),
+# which generate() resets on every call, so only one generation may run at a time
+gemma_lock = threading.Lock()
+
+def load_nllb(path):
+    tokenizer = AutoTokenizer.from_pretrained(path, local_files_only=True)
+    model = AutoModelForSeq2SeqLM.from_pretrained(
+        path,
         device_map="auto",
         quantization_config=bnb_config,
         local_files_only=True,
+        low_cpu_mem_usage=True,
         torch_dtype=torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16,
+        attn_implementation="sdpa",
     )
-    nllb_available = True
-except Exception as e:
-    print(f"Error loading NLLB model: {e}")
-    print("Falling back to Facebook model...")
+    return model, tokenizer
+
+@lru_cache(maxsize=1)
+def _nllb():
+    try:
+        print(f"Loading NLLB model from {NLLB_PATH}...")
+        return load_nllb(NLLB_PATH)
+    except Exception as e:
+        print(f"Error loading NLLB model: {e}")
+        print("Falling back to Facebook model...")
+
+    # Release whatever the failed load had already allocated before loading the fallback
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
     try:
-        nllb_tokenizer = AutoTokenizer.from_pretrained(FACEBOOK_PATH, local_files_only=True)
-        nllb_model = AutoModelForSeq2SeqLM.from_pretrained(
-            FACEBOOK_PATH,
+        return load_nllb(FACEBOOK_PATH)
+    except Exception as e:
+        print(f"Error loading Facebook model: {e}")
+        return None, None
+
+def get_nllb():
+    """Return the NLLB (model, tokenizer), loading them on first use; (None, None) if unavailable"""
+    with model_lock:
+        return _nllb()
+
+@lru_cache(maxsize=1)
+def _gemma():
+    try:
+        print(f"Loading Gemma model from {GEMMA_PATH}...")
+        gemma_tokenizer = AutoTokenizer.from_pretrained(GEMMA_PATH, local_files_only=True)
+        gemma_model = AutoModelForCausalLM.from_pretrained(
+            GEMMA_PATH,
             device_map="auto",
             quantization_config=bnb_config,
             local_files_only=True,
+            low_cpu_mem_usage=True,
             torch_dtype=torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16,
+            attn_implementation=GEMMA_ATTN_IMPLEMENTATION,
         )
-        nllb_available = True
     except Exception as e:
-        print(f"Error loading Facebook model: {e}")
-        nllb_available = False
+        print(f"Error loading Gemma model: {e}")
+        return None, None
 
-# Load Gemma model and tokenizer
-try:
-    print(f"Loading Gemma model from {GEMMA_PATH}...")
-    gemma_tokenizer = AutoTokenizer.from_pretrained(GEMMA_PATH, local_files_only=True)
-    gemma_model = AutoModelForCausalLM.from_pretrained(
-        GEMMA_PATH,
-        device_map="auto",
-        quantization_config=bnb_config,
-        local_files_only=True,
-        torch_dtype=torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16,
-    )
-    gemma_available = True
-except Exception as e:
-    print(f"Error loading Gemma model: {e}")
-    gemma_available = False
+    # Capture the Gemma decode step as a CUDA graph on GPU, keeping the eager model if that fails
+    if torch.cuda.is_available():
+        eager_forward = gemma_model.forward
+        try:
+            print("Compiling Gemma model with torch.compile...")
+            if gemma_tokenizer.pad_token is None:
+                gemma_tokenizer.pad_token = gemma_tokenizer.eos_token
+            gemma_tokenizer.padding_side = "left"
+            gemma_model.forward = torch.compile(eager_forward, mode="reduce-overhead", fullgraph=False)
+            gemma_generate(gemma_model, gemma_tokenizer, "Namaste")  # pay the compilation cost up front
+        except Exception as e:
+            print(f"Could not compile Gemma model, using eager mode: {e}")
+            gemma_model.forward = eager_forward
 
-# Translation function
-def translate(text):
-    if not nllb_available:
-        return f"[Translation not available: {text}]"
+    return gemma_model, gemma_tokenizer
 
-    try:
-        # Format the input prompt to match training format
-        prompt = f"Translate from Hinglish to Kumaoni language: {text}"
+def get_gemma():
+    """Return the Gemma (model, tokenizer), loading them on first use; (None, None) if unavailable"""
+    with model_lock:
+        return _gemma()
+
+# Translation requests arriving within BATCH_TIMEOUT seconds of each other share one generate call
+MAX_BATCH_SIZE = 16
+BATCH_TIMEOUT = 0.01
+
+def to_device(inputs, device):
+    # Pinned host memory lets the copy to the GPU run without blocking
+    if device.type != "cuda":
+        return inputs.to(device)
+    return {k: v.pin_memory().to(device, non_blocking=True) for k, v in inputs.items()}
+
+# Translation functions
+def translate_batch(texts):
+    nllb_model, nllb_tokenizer = get_nllb()
+    if nllb_model is None:
+        return [f"[Translation not available: {text}]" for text in texts]
 
-        # Tokenize and generate
-        inputs = nllb_tokenizer(
-            prompt,
+    try:
+        # Tokenize and generate the whole batch at once, forcing the target language token
+        nllb_tokenizer.src_lang = SRC_LANG
+        inputs = to_device(nllb_tokenizer(
+            texts,
             return_tensors="pt",
             max_length=64,
-            truncation=True
-        ).to(nllb_model.device)
-        outputs = nllb_model.generate(**inputs, max_new_tokens=50)
-        generated_text = nllb_tokenizer.decode(outputs[0], skip_special_tokens=True)
-
-        # Extract only the Kumaoni part
-        if "Kumaoni:" in generated_text:
-            translation = generated_text.split("Kumaoni:")[-1].strip()
-        else:
-            translation = generated_text.strip()
-
-        return translation
+            truncation=True,
+            padding=True
+        ), nllb_model.device)
+        with torch.inference_mode():
+            outputs = nllb_model.generate(
+                **inputs,
+                max_new_tokens=50,
+                num_beams=1,
+                use_cache=True,
+                forced_bos_token_id=nllb_tokenizer.convert_tokens_to_ids(TGT_LANG)
+            )
+        return [text.strip() for text in nllb_tokenizer.batch_decode(outputs, skip_special_tokens=True)]
     except Exception as e:
         print(f"Translation error: {e}")
-        return f"[Translation error: {text}]"
+        return [f"[Translation error: {text}]" for text in texts]
 
-# Chat function
-def respond(message, history):
-    # Detect language and translate if needed
-    try:
-        if message.strip() and detect(message) in ["hi", "en"]:
-            translated = translate(message)
-            message = f"User said: {translated}"
-    except Exception as e:
-        print(f"Language detection error: {e}")
+def translate(text):
+    return translate_batch([text])[0]
+
+class TranslationBatcher:
+    """Collect concurrent translate calls from the chat handlers into batches"""
+
+    def __init__(self, max_batch_size=MAX_BATCH_SIZE, timeout=BATCH_TIMEOUT):
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout
+        self.queue = None
+        self.worker = None
+
+    async def submit(self, text):
+        """Queue a text for translation and wait for its result"""
+        # The queue and its worker live on Gradio's event loop, so start them on first use
+        # (the task is kept on self, since the loop only holds a weak reference to it)
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+            self.worker = asyncio.get_running_loop().create_task(self.run())
+
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, future))
+        return await future
 
-    # Generate response
-    if not gemma_available:
+    async def run(self):
+        """Pop up to max_batch_size requests per timeout window and translate them together"""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.timeout
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                # Generation blocks, so run it off the event loop
+                translations = await loop.run_in_executor(None, translate_batch, [text for text, _ in batch])
+            except Exception as e:
+                # Fail this batch's callers but keep the worker alive for the next one
+                print(f"Translation error: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), translation in zip(batch, translations):
+                if not future.done():
+                    future.set_result(translation)
+
+translator = TranslationBatcher()
+
+# Gemma replies are generated one at a time (see gemma_lock) on their own thread, so
+# waiting chats queue here instead of tying up the default executor's threads
+gemma_executor = ThreadPoolExecutor(max_workers=1)
+
+def gemma_generate(gemma_model, gemma_tokenizer, message):
+    # A compiled model gets prompts padded to 128 tokens and a static cache,
+    # so every call has the same shapes
+    compiled = hasattr(gemma_model.forward, "_torchdynamo_orig_callable")
+    prompt = f"Respond in Kumaoni to: {message}"
+    padding = "max_length" if compiled else False
+    inputs = to_device(gemma_tokenizer(prompt, return_tensors="pt", max_length=128, truncation=True,
+                                       padding=padding), gemma_model.device)
+    cache_kwargs = {"cache_implementation": "static"} if compiled else {}
+    outputs = gemma_model.generate(**inputs, max_new_tokens=80, temperature=0.7, **cache_kwargs)
+    return gemma_tokenizer.decode(outputs[0], skip_special_tokens=True)
+
+def generate_response(message):
+    gemma_model, gemma_tokenizer = get_gemma()
+    if gemma_model is None:
         return "I'm sorry, the Kumaoni assistant is not available right now."
 
     try:
-        prompt = f"Respond in Kumaoni to: {message}"
-        inputs = gemma_tokenizer(prompt, return_tensors="pt", max_length=128, truncation=True).to(gemma_model.device)
-        outputs = gemma_model.generate(**inputs, max_new_tokens=80, temperature=0.7)
-        return gemma_tokenizer.decode(outputs[0], skip_special_tokens=True)
+        with gemma_lock:
+            return gemma_generate(gemma_model, gemma_tokenizer, message)
     except Exception as e:
         print(f"Response generation error: {e}")
         return "I'm sorry, I couldn't generate a response."
 
+# Roman-script (English/Hinglish) messages are translated first; Devanagari ones are passed through
+LATIN_RE = re.compile(r"[A-Za-z]")
+DEVANAGARI_RE = re.compile(r"[\u0900-\u097F]")
+
+# Chat function
+async def respond(message, history):
+    # Translate Hinglish/English input before responding
+    if LATIN_RE.search(message) and not DEVANAGARI_RE.search(message):
+        translated = await translator.submit(message)
+        message = f"User said: {translated}"
+
+    # Generate response (loading the model on first use blocks, so run it off the event loop)
+    return await asyncio.get_running_loop().run_in_executor(gemma_executor, generate_response, message)
+
 # Launch Gradio app
 gr.ChatInterface(
     respond,
+    concurrency_limit=MAX_BATCH_SIZE,  # let enough chats run at once to fill a translation batch
     examples=["Namaste", "What's Almora famous for?"],
     title="Kumaoni Assistant"
 ).launch()
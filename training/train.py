@@ -1,4 +1,6 @@
-from datasets import load_dataset
+import torch
+import json
+from datasets import load_dataset, load_from_disk
 from transformers import (
     AutoModelForSeq2SeqLM,
     AutoTokenizer,
@@ -15,9 +17,25 @@ MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file_
 DATASET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data/data.json")
 OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "nllb-kumaoni")
 
+# NLLB language codes (Kumaoni has no code of its own, Nepali is the closest)
+SRC_LANG = "hin_Deva"
+TGT_LANG = "npi_Deva"
+
+# bf16 mixed precision on Ampere+ GPUs (no loss scaling needed), fp16 elsewhere
+USE_BF16 = torch.cuda.is_available() and torch.cuda.is_bf16_supported()
+
+# Worker processes for dataset tokenization
+NUM_PROC = min(8, os.cpu_count() or 1)
+
+# Tokenized dataset from the last run, keyed by the dataset file and tokenizer settings
+TOKENIZED_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data/.cache/nllb_tokenized")
+TOKENIZED_CACHE_VERSION = 2  # bump when preprocess changes
+
 # Load tokenizer
 tokenizer = AutoTokenizer.from_pretrained(
     MODEL_DIR,
+    src_lang=SRC_LANG,
+    tgt_lang=TGT_LANG,
     local_files_only=True
 )
 
@@ -29,6 +47,8 @@ model = AutoModelForSeq2SeqLM.from_pretrained(
     MODEL_DIR,
     device_map="auto",
     load_in_8bit=True,  # Use 8-bit quantization to save memory
+    attn_implementation="sdpa",  # fused PyTorch attention kernels
+    low_cpu_mem_usage=True,  # load weights straight into place instead of a random init first
     local_files_only=True
 )
 
@@ -37,43 +57,80 @@ model = AutoModelForSeq2SeqLM.from_pretrained(
 peft_config = LoraConfig(
     r=8,
     lora_alpha=32,
-    target_modules=["q_proj", "v_proj"],
+    # Every attention and feed-forward linear layer (NLLB names them out_proj/fc1/fc2)
+    target_modules=["q_proj", "k_proj", "v_proj", "out_proj", "fc1", "fc2"],
     lora_dropout=0.05,
     task_type="SEQ_2_SEQ_LM"
 )
 
 model = get_peft_model(model, peft_config)
 
+# Recompute activations in the backward pass instead of storing them
+# (the KV cache is useless during training and conflicts with checkpointing)
+model.gradient_checkpointing_enable()
+model.enable_input_require_grads()
+model.config.use_cache = False
+
 # Preprocessing function
 def preprocess(examples):
-    # Add a clear instruction and language tags to help the model understand
-    inputs = [f"Translate from Hinglish to Kumaoni language: {x}" for x in examples["hinglish"]]
-
-    # Tokenize inputs with attention to padding
-    model_inputs = tokenizer(inputs, max_length=64, truncation=True, padding="max_length")
-
-    # Tokenize outputs (Kumaoni text)
-    # Add a prefix to help the model identify the target language
-    target_texts = [f"Kumaoni: {x}" for x in examples["kumaoni"]]
-    labels = tokenizer(target_texts, max_length=64, truncation=True, padding="max_length")
-
-    # Set labels for training
-    model_inputs["labels"] = labels["input_ids"]
+    # The tokenizer adds the source/target language tokens, so the raw text
+    # is used directly instead of a natural-language instruction
+    model_inputs = tokenizer(
+        examples["hinglish"],
+        text_target=examples["kumaoni"],
+        max_length=64,
+        truncation=True  # padded per batch by the collator
+    )
+
+    # Source token counts, used by the trainer to group similar-length examples
+    model_inputs["length"] = [len(input_ids) for input_ids in model_inputs["input_ids"]]
 
     return model_inputs
 
-# Load dataset
-dataset = load_dataset("json", data_files=DATASET_PATH, split="train")
-dataset = dataset.map(preprocess, batched=True)
+def tokenized_cache_key():
+    """What the tokenized dataset is built from"""
+    return {
+        "version": TOKENIZED_CACHE_VERSION,
+        "dataset": os.stat(DATASET_PATH).st_mtime_ns,
+        "tokenizer": MODEL_DIR,
+        "languages": [SRC_LANG, TGT_LANG],
+    }
+
+def load_tokenized_cache():
+    """Load the tokenized dataset saved by an earlier run, or None if it is missing or stale"""
+    try:
+        with open(os.path.join(TOKENIZED_CACHE_DIR, "cache_key.json"), 'r', encoding='utf-8') as f:
+            if json.load(f) != tokenized_cache_key():
+                return None
+        return load_from_disk(TOKENIZED_CACHE_DIR)
+    except Exception:
+        return None
+
+# Load dataset (already tokenized if an earlier run cached it)
+dataset = load_tokenized_cache()
+if dataset is None:
+    dataset = load_dataset("json", data_files=DATASET_PATH, split="train")
+    dataset = dataset.map(preprocess, batched=True, batch_size=1000, num_proc=NUM_PROC, load_from_cache_file=True)
+    try:
+        dataset.save_to_disk(TOKENIZED_CACHE_DIR)
+        with open(os.path.join(TOKENIZED_CACHE_DIR, "cache_key.json"), 'w', encoding='utf-8') as f:
+            json.dump(tokenized_cache_key(), f)
+    except Exception as e:
+        print(f"Error saving {TOKENIZED_CACHE_DIR}: {e}")
 
 # Training arguments for stable & accurate training
 training_args = Seq2SeqTrainingArguments(
     output_dir=OUTPUT_DIR,
-    per_device_train_batch_size=2,
-    gradient_accumulation_steps=4,
+    per_device_train_batch_size=8,  # Checkpointing frees room for larger batches
+    gradient_accumulation_steps=1,
+    gradient_checkpointing=True,
+    optim="paged_adamw_8bit",  # bitsandbytes 8-bit AdamW with paged state
+    group_by_length=True,  # batch similar lengths together so less padding is needed
+    length_column_name="length",
     learning_rate=3e-5,   # More stable for fine-tuning
     num_train_epochs=3,
-    fp16=True,
+    bf16=USE_BF16,
+    fp16=not USE_BF16,
     save_strategy="epoch",
     logging_steps=10,
 )
@@ -82,7 +139,7 @@ trainer = Seq2SeqTrainer(
     model=model,
     args=training_args,
     train_dataset=dataset,
-    data_collator=DataCollatorForSeq2Seq(tokenizer, model=model),
+    data_collator=DataCollatorForSeq2Seq(tokenizer, model=model, pad_to_multiple_of=8),
 )
 
 # Train and save
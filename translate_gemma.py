@@ -6,16 +6,55 @@ This script uses a fine-tuned Gemma model to translate Hinglish to Kumaoni.
 
 import os
 import argparse
+from functools import lru_cache
 import torch
 from transformers import AutoModelForCausalLM, AutoTokenizer
 from peft import PeftModel
 
+# flash-attn is optional - without it the Gemma model uses SDPA
+try:
+    import flash_attn
+except ImportError:
+    flash_attn = None
+
 # Paths
 MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models/gemma")
 OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gemma-kumaoni")
 
-def load_model(model_path=OUTPUT_DIR, base_model_path=MODEL_DIR):
-    """Load the fine-tuned model and tokenizer"""
+# Half precision on GPU (bf16 where supported), full precision on CPU
+if torch.cuda.is_available():
+    TORCH_DTYPE = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+else:
+    TORCH_DTYPE = torch.float32
+
+# Fused attention kernels: Flash-Attention 2 (half precision on Ampere+) or PyTorch SDPA
+if flash_attn is not None and torch.cuda.is_available() and torch.cuda.get_device_capability()[0] >= 8:
+    ATTN_IMPLEMENTATION = "flash_attention_2"
+else:
+    ATTN_IMPLEMENTATION = "sdpa"
+
+# Prompts are truncated to this many tokens (and padded to it for a compiled model)
+MAX_PROMPT_LENGTH = 128
+
+# The prompt around each input text: PROMPT_PREFIX + " " + text + PROMPT_SUFFIX
+PROMPT_PREFIX = "Translate from Hinglish to Kumaoni:\nHinglish:"
+PROMPT_SUFFIX = "\nKumaoni:"
+
+# Decoding settings shared by every model.generate call (greedy: deterministic
+# translations and one decoder pass per token)
+GENERATION_CONFIG = {
+    "num_beams": 1,
+    "do_sample": False,
+    "use_cache": True,
+}
+
+@lru_cache(maxsize=2)
+def load_model(model_path=OUTPUT_DIR, base_model_path=MODEL_DIR, compile_model=True):
+    """Load the fine-tuned model and tokenizer
+
+    Results are cached, so repeated calls with the same arguments reuse the
+    already loaded weights.
+    """
     print(f"Loading model from {model_path}...")
     
     # Check if fine-tuned model exists
@@ -30,53 +69,116 @@ def load_model(model_path=OUTPUT_DIR, base_model_path=MODEL_DIR):
     if tokenizer.pad_token is None:
         tokenizer.pad_token = tokenizer.eos_token
     
-    # Load model
-    if model_path == base_model_path:
-        # Load base model directly
-        model = AutoModelForCausalLM.from_pretrained(
-            model_path,
-            device_map="auto",
-            local_files_only=True
-        )
-    else:
-        # Load base model first
-        base_model = AutoModelForCausalLM.from_pretrained(
-            base_model_path,
-            device_map="auto",
-            local_files_only=True
-        )
-        
-        # Load the fine-tuned model
+    # Batched prompts are padded on the left so generation continues right after each prompt
+    tokenizer.padding_side = "left"
+    
+    # Half precision weights with fused attention kernels
+    model_kwargs = {
+        "device_map": "auto",
+        "torch_dtype": TORCH_DTYPE,
+        "attn_implementation": ATTN_IMPLEMENTATION,
+        "low_cpu_mem_usage": True,
+        "local_files_only": True,
+    }
+    
+    # Load the base model once, then attach the fine-tuned adapters if there are any
+    model = AutoModelForCausalLM.from_pretrained(base_model_path, **model_kwargs)
+    
+    if model_path != base_model_path:
         try:
-            model = PeftModel.from_pretrained(base_model, model_path)
+            model = PeftModel.from_pretrained(model, model_path)
             print("Loaded fine-tuned model with LoRA adapters")
         except Exception as e:
             print(f"Error loading fine-tuned model: {e}")
             print("Falling back to base model")
-            model = base_model
+        else:
+            # Fold the adapters into the base weights so each projection is a single matmul
+            try:
+                model = model.merge_and_unload()
+                print("Merged LoRA adapters into base weights")
+            except Exception as e:
+                print(f"Could not merge LoRA adapters, using unmerged model: {e}")
+    
+    model.eval()
+    
+    # On GPU, compile the forward pass; with a static KV cache and fixed prompt
+    # length every decode step replays one captured CUDA graph
+    if compile_model and torch.cuda.is_available():
+        print("Compiling model with torch.compile...")
+        model.forward = torch.compile(model.forward, mode="reduce-overhead", fullgraph=False)
+        
+        # Pay the compilation cost once, here, instead of on the first translation
+        translate("namaste", model, tokenizer)
     
     return model, tokenizer
 
+def is_compiled(model):
+    """Check whether the model's forward pass has been wrapped with torch.compile"""
+    return hasattr(model.forward, "_torchdynamo_orig_callable")
+
+@lru_cache(maxsize=4)
+def prompt_affix_ids(tokenizer):
+    """Token ids of the fixed prompt text before and after the input, tokenized once per tokenizer"""
+    bos_ids = [tokenizer.bos_token_id] if tokenizer.bos_token_id is not None else []
+    prefix_ids = tokenizer(PROMPT_PREFIX, add_special_tokens=False)["input_ids"]
+    suffix_ids = tokenizer(PROMPT_SUFFIX, add_special_tokens=False)["input_ids"]
+    return bos_ids + prefix_ids, suffix_ids
+
+def encode_prompts(texts, model, tokenizer):
+    """Build the prompt ids for each text, padding to the longest one (or to MAX_PROMPT_LENGTH for a compiled model)"""
+    prefix_ids, suffix_ids = prompt_affix_ids(tokenizer)
+    
+    # Only the input texts are tokenized; the fixed prompt ids are spliced around them
+    text_ids = tokenizer([" " + text for text in texts], add_special_tokens=False)["input_ids"]
+    features = [{"input_ids": (prefix_ids + ids + suffix_ids)[:MAX_PROMPT_LENGTH]} for ids in text_ids]
+    
+    padding = "max_length" if is_compiled(model) else True
+    inputs = tokenizer.pad(features, padding=padding, max_length=MAX_PROMPT_LENGTH, return_tensors="pt")
+    return to_device(inputs, model.device)
+
+def to_device(inputs, device):
+    """Move tokenized inputs to the model's device (from pinned memory, without blocking, on GPU)"""
+    if device.type != "cuda":
+        return {k: v.to(device) for k, v in inputs.items()}
+    return {k: v.pin_memory().to(device, non_blocking=True) for k, v in inputs.items()}
+
+def generation_kwargs(model, tokenizer, max_length=100):
+    """Keyword arguments shared by every model.generate call"""
+    kwargs = {
+        **GENERATION_CONFIG,
+        "max_new_tokens": max_length,
+        "pad_token_id": tokenizer.pad_token_id,
+        "eos_token_id": tokenizer.eos_token_id,
+    }
+    if is_compiled(model):
+        # A preallocated cache keeps the shapes fixed, so the graph is not recaptured
+        kwargs["cache_implementation"] = "static"
+    return kwargs
+
+def decoding_params(max_length=100, compile_model=True):
+    """Settings that determine translate_batch's output for the given load_model options
+
+    Computed without loading the model, so callers can key cached translations on it.
+    """
+    compiled = compile_model and torch.cuda.is_available()
+    return {
+        **GENERATION_CONFIG,
+        "max_new_tokens": max_length,
+        "static_cache": compiled,
+        "torch_dtype": str(TORCH_DTYPE),
+        "attn_implementation": ATTN_IMPLEMENTATION,
+        "max_prompt_length": MAX_PROMPT_LENGTH,
+        "prompt": PROMPT_PREFIX + " {text}" + PROMPT_SUFFIX,
+    }
+
 def translate(text, model, tokenizer, max_length=100):
     """Translate Hinglish text to Kumaoni"""
-    # Format the input prompt
-    prompt = f"Translate from Hinglish to Kumaoni:\nHinglish: {text}\nKumaoni:"
-    
-    # Tokenize the input
-    inputs = tokenizer(prompt, return_tensors="pt", max_length=128, truncation=True)
-    inputs = {k: v.to(model.device) for k, v in inputs.items()}
+    # Build the input prompt
+    inputs = encode_prompts([text], model, tokenizer)
     
     # Generate the translation
-    with torch.no_grad():
-        outputs = model.generate(
-            **inputs,
-            max_new_tokens=max_length,
-            temperature=0.7,
-            top_p=0.9,
-            do_sample=True,
-            pad_token_id=tokenizer.pad_token_id,
-            eos_token_id=tokenizer.eos_token_id
-        )
+    with torch.inference_mode():
+        outputs = model.generate(**inputs, **generation_kwargs(model, tokenizer, max_length))
     
     # Decode the generated text
     generated_text = tokenizer.decode(outputs[0], skip_special_tokens=True)
@@ -88,6 +190,24 @@ def translate(text, model, tokenizer, max_length=100):
     except:
         return generated_text
 
+def translate_batch(texts, model, tokenizer, max_length=100, batch_size=16):
+    """Translate a list of Hinglish texts to Kumaoni, batch_size texts per generate call"""
+    translations = []
+    
+    for start in range(0, len(texts), batch_size):
+        # Build the prompts for the whole batch at once
+        inputs = encode_prompts(texts[start:start + batch_size], model, tokenizer)
+        
+        # Generate the translations
+        with torch.inference_mode():
+            outputs = model.generate(**inputs, **generation_kwargs(model, tokenizer, max_length))
+        
+        # Extract only the Kumaoni part of each generated text
+        for generated_text in tokenizer.batch_decode(outputs, skip_special_tokens=True):
+            translations.append(generated_text.split("Kumaoni:")[-1].strip())
+    
+    return translations
+
 def main():
     parser = argparse.ArgumentParser(description="Translate Hinglish to Kumaoni")
     parser.add_argument("--text", type=str, help="Text to translate")
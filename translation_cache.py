@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of translations for the test scripts.
+Outputs are keyed by the model files, the decoding settings and the input
+text, so re-running a test on unchanged inputs skips the model entirely.
+Set TRANSLATION_NO_CACHE=1 to force every translation to be recomputed.
+"""
+
+import os
+import json
+import sqlite3
+import hashlib
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/.cache/translations.sqlite3")
+
+def model_fingerprint(*model_dirs):
+    """Hash the file names, sizes and mtimes under the model directories (without reading the weights)"""
+    digest = hashlib.blake2b(digest_size=16)
+    for model_dir in model_dirs:
+        digest.update(model_dir.encode('utf-8'))
+        for root, dirs, files in os.walk(model_dir):
+            dirs.sort()
+            for name in sorted(files):
+                stat = os.stat(os.path.join(root, name))
+                digest.update(f"{os.path.relpath(os.path.join(root, name), model_dir)}|{stat.st_size}|{stat.st_mtime_ns}".encode('utf-8'))
+    return digest.hexdigest()
+
+class TranslationCache:
+    def __init__(self, model_sha, params, path=CACHE_PATH):
+        """Open (or create) the cache for one model and set of decoding params"""
+        self.prefix = f"{model_sha}|{json.dumps(params, sort_keys=True)}|"
+        self.enabled = os.environ.get("TRANSLATION_NO_CACHE", "") in ("", "0")
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS translations (key TEXT PRIMARY KEY, value TEXT)")
+
+    def key(self, text):
+        """Cache key for one input text"""
+        return hashlib.blake2b(f"{self.prefix}{text}".encode('utf-8')).hexdigest()
+
+    def translate_batch(self, texts, translate_fn):
+        """Return translations for texts, calling translate_fn only on the ones not cached yet"""
+        keys = [self.key(text) for text in texts]
+
+        cached = {}
+        if self.enabled:
+            placeholders = ",".join("?" * len(keys))
+            cached = dict(self.conn.execute(
+                f"SELECT key, value FROM translations WHERE key IN ({placeholders})", keys
+            ))
+
+        # Translate each distinct missing text once
+        missing = list(dict.fromkeys(text for text, key in zip(texts, keys) if key not in cached))
+        if missing:
+            results = translate_fn(missing)
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO translations (key, value) VALUES (?, ?)",
+                    [(self.key(text), result) for text, result in zip(missing, results)]
+                )
+            cached.update((self.key(text), result) for text, result in zip(missing, results))
+
+        return [cached[key] for key in keys]